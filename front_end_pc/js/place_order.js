@@ -13,7 +13,8 @@ var vm = new Vue({
         order_submitting: false, // 正在提交订单标志
         pay_method: 1, // 支付方式,
         nowsite:0, // 默认地址
-        addresses: []
+        addresses: [],
+        quote_id: '' // 结算报价编号,下单时提交
     },
     mounted: function(){
         // 获取地址信息
@@ -45,6 +46,7 @@ var vm = new Vue({
             .then(response => {
                 this.skus = response.data.skus;
                 this.freight = response.data.freight;
+                this.quote_id = response.data.quote_id;
                 this.total_count = 0;
                 this.total_amount = 0;
                 for(var i=0; i<this.skus.length; i++){
@@ -72,14 +74,50 @@ var vm = new Vue({
             localStorage.clear();
             location.href = '/login.html';
         },
-        // 提交订单
+        // 跳转到下单成功页面
+        to_order_success: function(order_id){
+            location.href = '/order_success.html?order_id='+order_id
+                +'&amount='+this.payment_amount
+                +'&pay='+this.pay_method;
+        },
+        // 查询异步下单的结果,排队或处理中时稍后再查询
+        poll_ticket: function(ticket, times){
+            if (times >= 120) {
+                this.order_submitting = false;
+                alert('下单超时,请到我的订单中查看');
+                return;
+            }
+            axios.get(this.host+'/orders/tickets/'+ticket+'/', {
+                    headers: {
+                        'Authorization': 'JWT ' + this.token
+                    },
+                    responseType: 'json'
+                })
+                .then(response => {
+                    if (response.data.status == 'created') {
+                        this.to_order_success(response.data.order_id);
+                    } else if (response.data.status == 'failed') {
+                        this.order_submitting = false;
+                        alert(response.data.reason);
+                    } else {
+                        setTimeout(() => {
+                            this.poll_ticket(ticket, times + 1);
+                        }, 500);
+                    }
+                })
+                .catch(error => {
+                    this.order_submitting = false;
+                    alert(error.response.data.detail || '下单失败');
+                })
+        },
         // 提交订单
         on_order_submit: function(){
             if (this.order_submitting == false){
                 this.order_submitting = true;
                 axios.post(this.host+'/orders/', {
                         address: this.nowsite,
-                        pay_method: this.pay_method
+                        pay_method: this.pay_method,
+                        quote_id: this.quote_id
                     }, {
                         headers: {
                             'Authorization': 'JWT ' + this.token
@@ -87,13 +125,24 @@ var vm = new Vue({
                         responseType: 'json'
                     })
                     .then(response => {
-                        location.href = '/order_success.html?order_id='+response.data.order_id
-                            +'&amount='+this.payment_amount
-                            +'&pay='+this.pay_method;
+                        if (response.status == 202) {
+                            // 异步下单,轮询下单凭证查询结果
+                            this.poll_ticket(response.data.ticket, 0);
+                        } else {
+                            this.to_order_success(response.data.order_id);
+                        }
                     })
                     .catch(error => {
                         this.order_submitting = false;
-                        alert(error.response.data[0]);
+                        var data = error.response.data;
+                        // 下单失败时返回错误信息列表,请求数据无效时返回各字段的错误
+                        if (data instanceof Array) {
+                            alert(data[0]);
+                        } else if (data.non_field_errors) {
+                            alert(data.non_field_errors[0]);
+                        } else {
+                            alert(data.detail || '下单失败');
+                        }
                     })
             }
         }
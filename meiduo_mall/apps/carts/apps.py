@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class CartsConfig(AppConfig):
     name = 'carts'
+
+    def ready(self):
+        # 注册信号,商品价格修改后更新购物车汇总
+        from . import signals
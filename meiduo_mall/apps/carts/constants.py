@@ -1,2 +1,11 @@
 # 购物车cookie的有效期
 CART_COOKIE_EXPIRES = 60 * 60 * 24 * 7
+
+# 未登录用户保存在redis中的购物车的有效期
+CART_TOKEN_EXPIRES = 60 * 60 * 24 * 7
+
+# 批量修改购物车时一次最多的操作数量
+CART_BATCH_OPERATIONS_LIMIT = 100
+
+# 读取购物车汇总时补充商品价格后重试的次数
+CART_SUMMARY_RETRIES = 3
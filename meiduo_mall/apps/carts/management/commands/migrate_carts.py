@@ -0,0 +1,45 @@
+import re
+import time
+from django.core.management.base import BaseCommand
+from django_redis import get_redis_connection
+from carts.storage import RedisCart
+
+
+class Command(BaseCommand):
+    """
+    将旧格式的购物车(cart%d + cart_selected%d)转换为新格式(cart_packed%d)
+    使用SCAN分批遍历,每批通过管道执行转换脚本,不阻塞redis
+    转换期间读写购物车时也会自动转换,所以可以在线执行
+    """
+    help = '在线迁移购物车数据为新的存储格式'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=500, help='每批转换的购物车数量')
+        parser.add_argument('--sleep', type=float, default=0, help='每批之间暂停的秒数')
+
+    def handle(self, *args, **options):
+        redis_cli = get_redis_connection('carts')
+        batch = options['batch']
+
+        migrated = 0
+        # 只有选中状态而没有数量的旧数据也要清理
+        for pattern in ('cart[0-9]*', 'cart_selected[0-9]*'):
+            user_ids = []
+            for key in redis_cli.scan_iter(match=pattern, count=batch):
+                user_ids.append(int(re.search(rb'\d+$', key).group()))
+                if len(user_ids) >= batch:
+                    migrated += self.migrate(redis_cli, user_ids)
+                    user_ids = []
+                    time.sleep(options['sleep'])
+            migrated += self.migrate(redis_cli, user_ids)
+
+        self.stdout.write('共转换%d个购物车' % migrated)
+
+    def migrate(self, redis_cli, user_ids):
+        if not user_ids:
+            return 0
+        pl = redis_cli.pipeline(transaction=False)
+        for user_id in user_ids:
+            RedisCart(user_id, redis_cli).migrate(client=pl)
+        pl.execute()
+        return len(user_ids)
@@ -0,0 +1,215 @@
+import json
+import re
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django_redis import get_redis_connection
+from redis.exceptions import ResponseError
+from users.constants import USER_BROWSING_HISTORY_COUNTS_LIMIT
+
+
+class Command(BaseCommand):
+    """
+    清理长期没有操作的购物车与浏览记录
+    使用SCAN分批遍历没有设置有效期的键(保留策略上线前写入的数据):
+    空闲时间超过保留期的键归档(可选)后删除,其余的键按剩余的保留时间设置有效期
+    浏览记录超过上限的部分截掉,没有对应购物车的汇总直接删除
+    每批通过管道执行,不阻塞redis
+    """
+    help = '清理长期没有操作的购物车与浏览记录,统计回收的内存'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=200, help='每批处理的键数量')
+        parser.add_argument('--sleep', type=float, default=0, help='每批之间暂停的秒数')
+        parser.add_argument('--archive', help='删除前将数据追加写入该文件,每行一个json')
+        parser.add_argument('--dry-run', action='store_true', help='只统计,不修改数据')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.archive = open(options['archive'], 'a') if options['archive'] else None
+        self.stats = {'scanned': 0, 'expired': 0, 'deleted': 0, 'trimmed': 0, 'reclaimed': 0}
+
+        # (redis别名, 键的模式, 保留时间)
+        rules = [
+            ('carts', 'cart_packed*', settings.CART_RETENTION),
+            ('carts', 'cart[0-9]*', settings.CART_RETENTION),
+            ('carts', 'cart_selected*', settings.CART_RETENTION),
+            ('history', 'history*', settings.HISTORY_RETENTION),
+        ]
+        used_before = {alias: self.used_memory(alias) for alias in ('carts', 'history')}
+
+        try:
+            for alias, pattern, retention in rules:
+                if retention:
+                    self.scan(get_redis_connection(alias), pattern, lambda redis_cli, keys: self.sweep(
+                        redis_cli, keys, retention, trim=alias == 'history'))
+            self.scan(get_redis_connection('carts'), 'cart_summary*', self.sweep_summaries)
+        finally:
+            if self.archive:
+                self.archive.close()
+
+        stats = self.stats
+        self.stdout.write('扫描%d个键, 设置有效期%d个, 删除%d个, 截短%d个' % (
+            stats['scanned'], stats['expired'], stats['deleted'], stats['trimmed']))
+        self.stdout.write('删除的键共占用%d字节' % stats['reclaimed'])
+        for alias, before in used_before.items():
+            after = self.used_memory(alias)
+            if before is not None and after is not None:
+                # 设置了有效期的键在过期后才释放内存
+                self.stdout.write('%s: 已用内存 %d -> %d 字节' % (alias, before, after))
+
+    def scan(self, redis_cli, pattern, sweep):
+        """
+        分批遍历匹配的键
+        """
+        keys = []
+        for key in redis_cli.scan_iter(match=pattern, count=self.options['batch']):
+            keys.append(key)
+            if len(keys) >= self.options['batch']:
+                sweep(redis_cli, keys)
+                keys = []
+                time.sleep(self.options['sleep'])
+        if keys:
+            sweep(redis_cli, keys)
+
+    def sweep(self, redis_cli, keys, retention, trim=False):
+        """
+        处理一批键
+        :param retention: 保留时间(秒)
+        :param trim: 是否截短浏览记录
+        """
+        self.stats['scanned'] += len(keys)
+
+        # 先读取空闲时间,ttl与type不会刷新空闲时间
+        pl = redis_cli.pipeline(transaction=False)
+        for key in keys:
+            pl.object('idletime', key)
+            pl.ttl(key)
+            pl.type(key)
+        try:
+            results = pl.execute()
+        except ResponseError:
+            # maxmemory-policy为LFU时不能读取空闲时间,只设置有效期
+            pl = redis_cli.pipeline(transaction=False)
+            for key in keys:
+                pl.ttl(key)
+                pl.type(key)
+            results = []
+            for ttl, key_type in zip(*[iter(pl.execute())] * 2):
+                results.extend([0, ttl, key_type])
+
+        stale, expiring = [], []
+        for key, idle, ttl, key_type in zip(keys, results[::3], results[1::3], results[2::3]):
+            # 已经设置了有效期或者已经被删除的键不处理
+            if ttl is None or ttl >= 0 or ttl == -2:
+                continue
+            if (idle or 0) >= retention:
+                stale.append((key, key_type))
+            else:
+                expiring.append((key, retention - (idle or 0)))
+
+        if trim:
+            self.trim(redis_cli, [key for key, _ in expiring])
+        self.delete(redis_cli, stale)
+
+        if not self.options['dry_run']:
+            pl = redis_cli.pipeline(transaction=False)
+            for key, expires in expiring:
+                pl.expire(key, expires)
+            pl.execute()
+        self.stats['expired'] += len(expiring)
+
+    def trim(self, redis_cli, keys):
+        """
+        截短超过上限的浏览记录
+        """
+        pl = redis_cli.pipeline(transaction=False)
+        for key in keys:
+            pl.llen(key)
+        lengths = pl.execute() if keys else []
+        long_keys = [key for key, length in zip(keys, lengths) if length > USER_BROWSING_HISTORY_COUNTS_LIMIT]
+        if long_keys and not self.options['dry_run']:
+            pl = redis_cli.pipeline(transaction=False)
+            for key in long_keys:
+                pl.ltrim(key, 0, USER_BROWSING_HISTORY_COUNTS_LIMIT - 1)
+            pl.execute()
+        self.stats['trimmed'] += len(long_keys)
+
+    def sweep_summaries(self, redis_cli, keys):
+        """
+        购物车汇总与购物车保持相同的有效期,购物车已经不存在时删除汇总
+        """
+        self.stats['scanned'] += len(keys)
+        carts = [b'cart_packed' + re.search(rb'\d+$', key).group() for key in keys]
+        pl = redis_cli.pipeline(transaction=False)
+        for key, cart in zip(keys, carts):
+            pl.ttl(key)
+            pl.pttl(cart)
+        results = pl.execute()
+
+        orphans, expiring = [], []
+        for key, ttl, cart_ttl in zip(keys, results[::2], results[1::2]):
+            if cart_ttl == -2:
+                orphans.append((key, b'hash'))
+            elif ttl == -1 and cart_ttl > 0:
+                expiring.append((key, cart_ttl))
+
+        self.delete(redis_cli, orphans, archive=False)
+        if not self.options['dry_run']:
+            pl = redis_cli.pipeline(transaction=False)
+            for key, cart_ttl in expiring:
+                pl.pexpire(key, cart_ttl)
+            pl.execute()
+        self.stats['expired'] += len(expiring)
+
+    def delete(self, redis_cli, keys, archive=True):
+        """
+        统计占用的内存,归档后删除
+        :param keys: [(key, type), ...]
+        """
+        if not keys:
+            return
+        self.stats['deleted'] += len(keys)
+        self.stats['reclaimed'] += self.memory_usage(redis_cli, [key for key, _ in keys])
+
+        if archive and self.archive:
+            self.write_archive(redis_cli, keys)
+        if not self.options['dry_run']:
+            redis_cli.delete(*[key for key, _ in keys])
+
+    def write_archive(self, redis_cli, keys):
+        readers = {
+            b'hash': lambda pl, key: pl.hgetall(key),
+            b'list': lambda pl, key: pl.lrange(key, 0, -1),
+            b'set': lambda pl, key: pl.smembers(key),
+        }
+        keys = [(key, key_type) for key, key_type in keys if key_type in readers]
+        pl = redis_cli.pipeline(transaction=False)
+        for key, key_type in keys:
+            readers[key_type](pl, key)
+        for (key, key_type), value in zip(keys, pl.execute()):
+            if isinstance(value, dict):
+                value = {k.decode(): v.decode() for k, v in value.items()}
+            else:
+                value = [v.decode() for v in value]
+            self.archive.write(json.dumps({'key': key.decode(), 'type': key_type.decode(), 'value': value}) + '\n')
+
+    @staticmethod
+    def memory_usage(redis_cli, keys):
+        """
+        删除前统计键占用的内存,redis版本低于4.0时不支持,返回0
+        """
+        pl = redis_cli.pipeline(transaction=False)
+        for key in keys:
+            pl.execute_command('MEMORY', 'USAGE', key)
+        try:
+            return sum(size or 0 for size in pl.execute())
+        except ResponseError:
+            return 0
+
+    @staticmethod
+    def used_memory(alias):
+        try:
+            return get_redis_connection(alias).info('memory')['used_memory']
+        except ResponseError:
+            return None
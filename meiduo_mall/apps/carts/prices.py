@@ -0,0 +1,60 @@
+from decimal import Decimal
+from django_redis import get_redis_connection
+from goods.utils import get_sku_cards
+from utils.redis_script import get_script
+from . import scripts
+
+# 购物车汇总使用的商品价格(分),与价格版本
+SKU_PRICE_KEY = 'sku_price'
+SKU_PRICE_VERSION_KEY = 'sku_price_version'
+
+
+def to_cents(price):
+    """
+    价格转换为分,汇总在redis中只做整数运算
+    """
+    return int(Decimal(price) * 100)
+
+
+def set_sku_price(sku_id, price):
+    """
+    商品修改或删除后更新购物车汇总使用的价格,价格变化时所有汇总在下次读取时重新计算
+    :param sku_id: 商品编号
+    :param price: 商品价格,商品删除时为None
+    """
+    redis_cli = get_redis_connection('carts')
+    script = get_script(redis_cli, scripts.SKU_PRICE_SET)
+    script(keys=[SKU_PRICE_KEY, SKU_PRICE_VERSION_KEY],
+           args=[sku_id, '' if price is None else to_cents(price)], client=redis_cli)
+
+
+def fill_sku_prices(sku_ids, redis_cli=None):
+    """
+    从商品卡片缓存中补充缺少的价格,已经删除的商品按0计算
+    只在价格不存在时写入,不覆盖同时由信号写入的新价格
+    :param sku_ids: 商品编号列表
+    """
+    redis_cli = redis_cli or get_redis_connection('carts')
+    sku_ids = [int(sku_id) for sku_id in sku_ids]
+    cards = get_sku_cards(sku_ids)
+    pl = redis_cli.pipeline(transaction=False)
+    for sku_id in sku_ids:
+        price = cards[sku_id]['price'] if sku_id in cards else 0
+        pl.hsetnx(SKU_PRICE_KEY, sku_id, to_cents(price))
+    pl.execute()
+
+
+def summarize(cart_dict):
+    """
+    在python中计算购物车汇总,用于cookie中的购物车
+    :param cart_dict: {sku_id: {'count': count, 'selected': selected}}
+    :return: {'count':, 'selected_count':, 'selected_amount':}
+    """
+    selected = {sku_id: item['count'] for sku_id, item in cart_dict.items() if item['selected']}
+    cards = get_sku_cards(selected.keys())
+    return {
+        'count': sum(item['count'] for item in cart_dict.values()),
+        'selected_count': sum(selected.values()),
+        'selected_amount': sum((cards[sku_id]['price'] * count for sku_id, count in selected.items() if sku_id in cards),
+                               Decimal('0.00')),
+    }
@@ -0,0 +1,248 @@
+"""
+购物车redis的lua脚本
+每个脚本在redis服务器端原子地执行,一次往返完成全部修改
+KEYS[1]: 购物车hash, 值为 数量 * 2 + 是否选中
+KEYS[2]: 购物车汇总hash, count(商品总数), selected_count(选中数量), selected_amount(选中金额,分), version(价格版本)
+KEYS[3]: 商品价格hash, sku_price, 值为价格(分)
+KEYS[4]: 价格版本, sku_price_version, 任何商品价格修改后加1
+KEYS[5]: 旧格式的商品数量hash, cart%d, 没有旧格式时不传
+KEYS[6]: 旧格式的选中状态set, cart_selected%d, 没有旧格式时不传
+ARGV[1]: 购物车的有效期(秒), 0表示不过期
+"""
+
+
+def _migrate(first):
+    """
+    旧格式存在时,先转换为新格式再执行后续操作,转换后汇总失效
+    :param first: 旧格式的键在KEYS中的位置
+    """
+    return """
+if #KEYS >= {selected} and (redis.call('exists', KEYS[{cart}]) == 1 or redis.call('exists', KEYS[{selected}]) == 1) then
+    local legacy = redis.call('hgetall', KEYS[{cart}])
+    for i = 1, #legacy, 2 do
+        local selected = redis.call('sismember', KEYS[{selected}], legacy[i])
+        redis.call('hsetnx', KEYS[1], legacy[i], tonumber(legacy[i + 1]) * 2 + selected)
+    end
+    redis.call('del', KEYS[{cart}], KEYS[{selected}], KEYS[2])
+end
+""".format(cart=first, selected=first + 1)
+
+
+_MIGRATE = _migrate(5)
+
+# 汇总与当前价格版本一致时增量修改,否则等到读取时重新计算
+# 空购物车直接初始化汇总
+_SUMMARY = """
+local version = redis.call('get', KEYS[4]) or '0'
+local valid = redis.call('hget', KEYS[2], 'version') == version
+if not valid and redis.call('exists', KEYS[1]) == 0 then
+    redis.call('hmset', KEYS[2], 'version', version, 'count', 0, 'selected_count', 0, 'selected_amount', 0)
+    if tonumber(ARGV[1]) > 0 then
+        redis.call('expire', KEYS[2], ARGV[1])
+    end
+    valid = true
+end
+
+-- 根据商品修改前后的值调整汇总,old/new: 数量 * 2 + 是否选中, 不存在为0
+local function adjust(sku_id, old, new)
+    if not valid then
+        return
+    end
+    old = tonumber(old or 0)
+    new = tonumber(new or 0)
+    local old_count = (old - old % 2) / 2
+    local new_count = (new - new % 2) / 2
+    local delta = new_count * (new % 2) - old_count * (old % 2)
+    if delta ~= 0 then
+        local price = redis.call('hget', KEYS[3], sku_id)
+        if not price then
+            -- 没有缓存价格时放弃增量修改
+            redis.call('del', KEYS[2])
+            valid = false
+            return
+        end
+        redis.call('hincrby', KEYS[2], 'selected_count', delta)
+        redis.call('hincrby', KEYS[2], 'selected_amount', tonumber(price) * delta)
+    end
+    if new_count ~= old_count then
+        redis.call('hincrby', KEYS[2], 'count', new_count - old_count)
+    end
+end
+"""
+
+# 修改后刷新有效期
+_TOUCH = """
+if tonumber(ARGV[1]) > 0 then
+    redis.call('expire', KEYS[1], ARGV[1])
+    redis.call('expire', KEYS[2], ARGV[1])
+end
+"""
+
+# 只做格式转换,供迁移命令使用
+CART_MIGRATE = _MIGRATE + """
+return redis.call('hlen', KEYS[1])
+"""
+
+# 读取整个购物车,查看购物车也刷新有效期
+CART_ITEMS = _MIGRATE + """
+local items = redis.call('hgetall', KEYS[1])
+""" + _TOUCH + """
+return items
+"""
+
+# 读取汇总,价格版本变化或汇总失效时重新计算
+# 返回 {1, count, selected_count, selected_amount}, 缺少商品价格时返回 {0, sku_id1, sku_id2, ...}
+CART_SUMMARY = _MIGRATE + """
+local version = redis.call('get', KEYS[4]) or '0'
+local summary = redis.call('hmget', KEYS[2], 'version', 'count', 'selected_count', 'selected_amount')
+if summary[1] == version then
+    return {1, tonumber(summary[2]), tonumber(summary[3]), tonumber(summary[4])}
+end
+
+local items = redis.call('hgetall', KEYS[1])
+if #items == 0 then
+    -- 已过期或者空的购物车不保存汇总,避免汇总比购物车存在得更久
+    redis.call('del', KEYS[2])
+    return {1, 0, 0, 0}
+end
+
+local count, selected_count, selected_amount, missing = 0, 0, 0, {}
+for i = 1, #items, 2 do
+    local value = tonumber(items[i + 1])
+    local sku_count = (value - value % 2) / 2
+    count = count + sku_count
+    if value % 2 == 1 then
+        local price = redis.call('hget', KEYS[3], items[i])
+        if price then
+            selected_count = selected_count + sku_count
+            selected_amount = selected_amount + tonumber(price) * sku_count
+        else
+            missing[#missing + 1] = items[i]
+        end
+    end
+end
+if #missing > 0 then
+    return {0, unpack(missing)}
+end
+
+redis.call('hmset', KEYS[2], 'version', version, 'count', count,
+    'selected_count', selected_count, 'selected_amount', selected_amount)
+local ttl = redis.call('pttl', KEYS[1])
+if ttl > 0 then
+    redis.call('pexpire', KEYS[2], ttl)
+end
+return {1, count, selected_count, selected_amount}
+"""
+
+# 添加商品:数量累加,选中时标记为选中
+# ARGV: ttl, sku_id, count, selected
+CART_ADD = _MIGRATE + _SUMMARY + """
+local old = tonumber(redis.call('hget', KEYS[1], ARGV[2]) or 0)
+local selected = old % 2
+if ARGV[4] == '1' then
+    selected = 1
+end
+local count = (old - old % 2) / 2 + tonumber(ARGV[3])
+redis.call('hset', KEYS[1], ARGV[2], count * 2 + selected)
+adjust(ARGV[2], old, count * 2 + selected)
+""" + _TOUCH + """
+return count
+"""
+
+# 修改商品:覆盖数量与选中状态
+# ARGV: ttl, sku_id, count, selected
+CART_UPDATE = _MIGRATE + _SUMMARY + """
+local old = redis.call('hget', KEYS[1], ARGV[2])
+local new = tonumber(ARGV[3]) * 2 + tonumber(ARGV[4])
+redis.call('hset', KEYS[1], ARGV[2], new)
+adjust(ARGV[2], old, new)
+""" + _TOUCH + """
+return 1
+"""
+
+# 修改单个商品的选中状态,购物车中没有该商品时不做处理
+# ARGV: ttl, sku_id, selected
+CART_SELECT = _MIGRATE + _SUMMARY + """
+local old = redis.call('hget', KEYS[1], ARGV[2])
+if not old then
+    return 0
+end
+old = tonumber(old)
+redis.call('hset', KEYS[1], ARGV[2], old - old % 2 + tonumber(ARGV[3]))
+adjust(ARGV[2], old, old - old % 2 + tonumber(ARGV[3]))
+""" + _TOUCH + """
+return 1
+"""
+
+# 全选或全不选
+# ARGV: ttl, selected
+CART_SELECT_ALL = _MIGRATE + _SUMMARY + """
+local items = redis.call('hgetall', KEYS[1])
+for i = 1, #items, 2 do
+    local old = tonumber(items[i + 1])
+    redis.call('hset', KEYS[1], items[i], old - old % 2 + tonumber(ARGV[2]))
+    adjust(items[i], old, old - old % 2 + tonumber(ARGV[2]))
+end
+""" + _TOUCH + """
+return #items / 2
+"""
+
+# 删除商品
+# ARGV: ttl, sku_id1, sku_id2, ...
+CART_DELETE = _MIGRATE + _SUMMARY + """
+local deleted = 0
+for i = 2, #ARGV do
+    local old = redis.call('hget', KEYS[1], ARGV[i])
+    if old then
+        redis.call('hdel', KEYS[1], ARGV[i])
+        adjust(ARGV[i], old, 0)
+        deleted = deleted + 1
+    end
+end
+""" + _TOUCH + """
+return deleted
+"""
+
+# 合并cookie中的购物车,cookie中的数量覆盖redis中的数量
+# ARGV: ttl, sku_id1, count1, selected1, sku_id2, count2, selected2, ...
+CART_MERGE = _MIGRATE + _SUMMARY + """
+for i = 2, #ARGV, 3 do
+    local old = redis.call('hget', KEYS[1], ARGV[i])
+    local new = tonumber(ARGV[i + 1]) * 2 + tonumber(ARGV[i + 2])
+    redis.call('hset', KEYS[1], ARGV[i], new)
+    adjust(ARGV[i], old, new)
+end
+""" + _TOUCH + """
+return (#ARGV - 1) / 3
+"""
+
+# 在服务器端合并另一个购物车,合并后删除被合并的购物车与它的汇总
+# KEYS[5], KEYS[6]: 被合并的购物车hash与汇总hash, 旧格式的键顺延为KEYS[7], KEYS[8]
+# ARGV: ttl
+CART_MERGE_KEY = _migrate(7) + _SUMMARY + """
+local items = redis.call('hgetall', KEYS[5])
+for i = 1, #items, 2 do
+    local old = redis.call('hget', KEYS[1], items[i])
+    redis.call('hset', KEYS[1], items[i], items[i + 1])
+    adjust(items[i], old, items[i + 1])
+end
+redis.call('del', KEYS[5], KEYS[6])
+""" + _TOUCH + """
+return #items / 2
+"""
+
+# 修改商品价格,已缓存的价格发生变化或商品删除时增加价格版本,使所有购物车汇总失效
+# KEYS[1]: sku_price, KEYS[2]: sku_price_version
+# ARGV: sku_id, 价格(分), 商品删除时为空字符串
+SKU_PRICE_SET = """
+local old = redis.call('hget', KEYS[1], ARGV[1])
+if ARGV[2] == '' then
+    redis.call('hdel', KEYS[1], ARGV[1])
+else
+    redis.call('hset', KEYS[1], ARGV[1], ARGV[2])
+end
+if old and old ~= ARGV[2] then
+    redis.call('incr', KEYS[2])
+end
+return old
+"""
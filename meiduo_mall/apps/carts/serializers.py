@@ -1,5 +1,8 @@
 from rest_framework import serializers
 from goods.models import SKU
+from goods.utils import is_launched_sku, get_launched_sku_ids
+from utils.cart_codec import MAX_COUNT
+from .constants import CART_BATCH_OPERATIONS_LIMIT
 
 
 class CartSerializer(serializers.Serializer):
@@ -7,13 +10,13 @@ class CartSerializer(serializers.Serializer):
     购物车数据序列化器
     """
     sku_id = serializers.IntegerField(min_value=1)
-    count = serializers.IntegerField(min_value=1)
+    # 数量不能超过cookie中能保存的最大值
+    count = serializers.IntegerField(min_value=1, max_value=MAX_COUNT)
     selected = serializers.BooleanField(default=True)
 
     def validate_sku_id(self, value):
-        try:
-            SKU.objects.get(pk=value)
-        except:
+        # 使用上架商品索引判断,不查询数据库
+        if not is_launched_sku(value):
             raise serializers.ValidationError('购物车是空的')
         return value
 
@@ -31,12 +34,63 @@ class CartDeleteSerializer(serializers.Serializer):
     sku_id = serializers.IntegerField(min_value=1)
 
     def validate_sku_id(self, value):
-        try:
-            SKU.objects.get(pk=value)
-        except:
+        # 已下架的商品也可以从购物车中删除,只有不在上架商品索引中时才查询数据库
+        if not is_launched_sku(value) and not SKU.objects.filter(pk=value).exists():
             raise serializers.ValidationError('该商品不存在')
         return value
 
 
 class CartSelectAllSerializer(serializers.Serializer):
     selected = serializers.BooleanField()
+
+
+class CartSummarySerializer(serializers.Serializer):
+    """
+    购物车汇总,用于页面头部显示购物车数量
+    """
+    count = serializers.IntegerField()
+    selected_count = serializers.IntegerField()
+    selected_amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+class CartOperationSerializer(serializers.Serializer):
+    """
+    批量修改购物车中的一个操作,商品编号由CartBatchSerializer统一验证
+    """
+    op = serializers.ChoiceField(choices=('add', 'update', 'select', 'delete'))
+    sku_id = serializers.IntegerField(min_value=1)
+    count = serializers.IntegerField(min_value=1, max_value=MAX_COUNT, required=False)
+    selected = serializers.BooleanField(default=True)
+
+    def validate(self, attrs):
+        if attrs['op'] in ('add', 'update') and 'count' not in attrs:
+            raise serializers.ValidationError('缺少商品数量')
+        return attrs
+
+
+class CartBatchSerializer(serializers.Serializer):
+    """
+    批量修改购物车
+    """
+    operations = CartOperationSerializer(many=True)
+
+    def validate_operations(self, value):
+        if not value:
+            raise serializers.ValidationError('没有需要执行的操作')
+        if len(value) > CART_BATCH_OPERATIONS_LIMIT:
+            raise serializers.ValidationError('一次最多执行%d个操作' % CART_BATCH_OPERATIONS_LIMIT)
+
+        # 所有商品编号一次验证
+        launched = get_launched_sku_ids({operation['sku_id'] for operation in value})
+        # 已下架的商品也可以删除,只查询不在上架商品索引中的商品
+        deleted = {operation['sku_id'] for operation in value if operation['op'] == 'delete'} - launched
+        if deleted:
+            deleted = set(SKU.objects.filter(id__in=deleted).values_list('id', flat=True))
+
+        invalid = sorted({
+            operation['sku_id'] for operation in value
+            if operation['sku_id'] not in launched and not (operation['op'] == 'delete' and operation['sku_id'] in deleted)
+        })
+        if invalid:
+            raise serializers.ValidationError('商品编号无效: %s' % ','.join(str(sku_id) for sku_id in invalid))
+        return value
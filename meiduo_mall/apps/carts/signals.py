@@ -0,0 +1,23 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from goods.models import SKU
+from .prices import set_sku_price
+
+
+@receiver(post_save, sender=SKU)
+def sku_saved(sender, instance, **kwargs):
+    """
+    商品保存后更新购物车汇总使用的价格
+    """
+    sku_id, price = instance.id, instance.price
+    transaction.on_commit(lambda: set_sku_price(sku_id, price))
+
+
+@receiver(post_delete, sender=SKU)
+def sku_deleted(sender, instance, **kwargs):
+    """
+    商品删除后移除价格
+    """
+    sku_id = instance.id
+    transaction.on_commit(lambda: set_sku_price(sku_id, None))
@@ -0,0 +1,293 @@
+import uuid
+from decimal import Decimal
+from django.conf import settings
+from django_redis import get_redis_connection
+from itsdangerous import Signer, BadData
+from utils import cart_codec
+from utils.redis_script import get_script
+from . import scripts
+from .constants import CART_COOKIE_EXPIRES, CART_TOKEN_EXPIRES, CART_SUMMARY_RETRIES
+from .prices import SKU_PRICE_KEY, SKU_PRICE_VERSION_KEY, fill_sku_prices, summarize
+
+
+def operation_args(operation):
+    """
+    批量修改时,每个操作对应购物车方法的参数
+    :param operation: {'op': 'add'/'update'/'select'/'delete', 'sku_id':, 'count':, 'selected':}
+    :return: 参数元组
+    """
+    op = operation['op']
+    if op in ('add', 'update'):
+        return operation['sku_id'], operation['count'], operation['selected']
+    if op == 'select':
+        return operation['sku_id'], operation['selected']
+    return operation['sku_id'],
+
+
+def unpack_cart(items):
+    """
+    将hash中的数据转换为购物车字典
+    :param items: {sku_id: 数量 * 2 + 是否选中}
+    :return: {sku_id: {'count': count, 'selected': selected}}
+    """
+    cart_dict = {}
+    for sku_id, value in items.items():
+        value = int(value)
+        cart_dict[int(sku_id)] = {
+            'count': value // 2,
+            'selected': bool(value % 2)
+        }
+    return cart_dict
+
+
+class RedisCart(object):
+    """
+    登录用户保存在redis中的购物车
+    数量与选中状态保存在同一个hash中,每个操作只与redis交互一次
+    """
+    # 批量修改时每个操作对应的脚本
+    operation_scripts = {
+        'add': scripts.CART_ADD,
+        'update': scripts.CART_UPDATE,
+        'select': scripts.CART_SELECT,
+        'delete': scripts.CART_DELETE,
+    }
+
+    def __init__(self, user_id, redis_cli=None):
+        self.key = 'cart_packed%d' % user_id
+        self.summary_key = 'cart_summary%d' % user_id
+        # 旧格式的键,在第一次访问时转换为新格式
+        self.legacy_keys = ['cart%d' % user_id, 'cart_selected%d' % user_id]
+        self.redis_cli = redis_cli or get_redis_connection('carts')
+
+    @property
+    def expires(self):
+        """
+        购物车的有效期,每次操作刷新,0表示不过期
+        """
+        return settings.CART_RETENTION
+
+    def _call(self, source, *args, client=None, keys=()):
+        # 布尔值转换为'1'/'0',与脚本中的判断保持一致
+        args = [int(arg) if isinstance(arg, bool) else arg for arg in args]
+        script = get_script(self.redis_cli, source)
+        keys = [self.key, self.summary_key, SKU_PRICE_KEY, SKU_PRICE_VERSION_KEY] + list(keys) + self.legacy_keys
+        return script(keys=keys, args=[self.expires] + args, client=client or self.redis_cli)
+
+    def migrate(self, client=None):
+        """
+        将旧格式的数据转换为新格式
+        :param client: 可以传入管道,批量执行
+        """
+        return self._call(scripts.CART_MIGRATE, client=client)
+
+    def items(self):
+        """
+        读取购物车
+        :return: {sku_id: {'count': count, 'selected': selected}}
+        """
+        items = self._call(scripts.CART_ITEMS)
+        return unpack_cart(dict(zip(items[::2], items[1::2])))
+
+    def selected_items(self):
+        """
+        读取选中的商品
+        :return: {sku_id: count}
+        """
+        return {sku_id: item['count'] for sku_id, item in self.items().items() if item['selected']}
+
+    def summary(self):
+        """
+        读取购物车汇总,修改购物车时已在redis中增量计算,通常只与redis交互一次
+        价格修改后汇总失效,读取时重新计算,缺少价格时补充后重试
+        :return: {'count': 商品总数, 'selected_count': 选中数量, 'selected_amount': 选中金额}
+        """
+        for _ in range(CART_SUMMARY_RETRIES):
+            result = self._call(scripts.CART_SUMMARY)
+            if result[0]:
+                return {
+                    'count': result[1],
+                    'selected_count': result[2],
+                    'selected_amount': Decimal(result[3]).scaleb(-2),
+                }
+            fill_sku_prices(result[1:], self.redis_cli)
+
+        # 价格一直在变化时直接计算
+        return summarize(self.items())
+
+    def add(self, sku_id, count, selected=True):
+        """
+        添加商品,数量累加
+        :return: 添加后的数量
+        """
+        return self._call(scripts.CART_ADD, sku_id, count, selected)
+
+    def update(self, sku_id, count, selected):
+        """
+        修改商品的数量与选中状态
+        """
+        return self._call(scripts.CART_UPDATE, sku_id, count, selected)
+
+    def select(self, sku_id, selected):
+        """
+        修改单个商品的选中状态
+        """
+        return self._call(scripts.CART_SELECT, sku_id, selected)
+
+    def select_all(self, selected):
+        """
+        全选或全不选
+        """
+        return self._call(scripts.CART_SELECT_ALL, selected)
+
+    def delete(self, *sku_ids):
+        """
+        删除商品
+        """
+        if not sku_ids:
+            return 0
+        return self._call(scripts.CART_DELETE, *sku_ids)
+
+    def merge(self, cart_dict):
+        """
+        合并购物车数据
+        :param cart_dict: {sku_id: {'count': count, 'selected': selected}}
+        """
+        args = []
+        for sku_id, item in cart_dict.items():
+            args.extend([sku_id, item.get('count'), bool(item.get('selected'))])
+        if not args:
+            return 0
+        return self._call(scripts.CART_MERGE, *args)
+
+    def apply(self, operations):
+        """
+        批量修改,所有操作在一个事务管道中执行,只与redis交互一次
+        :param operations: [{'op':, 'sku_id':, 'count':, 'selected':}, ...]
+        """
+        pl = self.redis_cli.pipeline()
+        for operation in operations:
+            self._call(self.operation_scripts[operation['op']], *operation_args(operation), client=pl)
+        return pl.execute()
+
+    def merge_cart(self, cart):
+        """
+        在redis中合并另一个购物车,合并后删除被合并的购物车
+        :param cart: 保存在同一个redis中的购物车
+        """
+        return self._call(scripts.CART_MERGE_KEY, keys=[cart.key, cart.summary_key])
+
+    def save(self, response):
+        """
+        修改已经写入redis,不需要处理响应
+        """
+        return response
+
+
+class TokenCart(RedisCart):
+    """
+    未登录用户保存在redis中的购物车
+    cookie中只保存签名后的随机令牌,购物车数据保存在redis中并设置有效期
+    """
+    expires = CART_TOKEN_EXPIRES
+    cookie_name = 'cart_token'
+
+    def __init__(self, token=None, redis_cli=None):
+        self.token = token or uuid.uuid4().hex
+        self.key = 'cart_token_%s' % self.token
+        self.summary_key = 'cart_token_summary_%s' % self.token
+        self.legacy_keys = []
+        self.redis_cli = redis_cli or get_redis_connection('carts')
+
+    @staticmethod
+    def signer():
+        return Signer(settings.SECRET_KEY, salt='cart_token')
+
+    @classmethod
+    def from_request(cls, request):
+        """
+        根据cookie中的令牌获取购物车,令牌无效时返回None
+        """
+        value = request.COOKIES.get(cls.cookie_name)
+        if not value:
+            return None
+        try:
+            token = cls.signer().unsign(value).decode()
+        except BadData:
+            return None
+        return cls(token)
+
+    def save(self, response):
+        """
+        写入令牌,同时刷新cookie的有效期
+        """
+        response.set_cookie(self.cookie_name, self.signer().sign(self.token.encode()).decode(), max_age=self.expires)
+        return response
+
+
+class CookieCart(object):
+    """
+    未登录用户保存在cookie中的购物车
+    修改后需要调用save()将数据写入响应的cookie
+    """
+    cookie_name = 'cart'
+
+    def __init__(self, request):
+        cart = request.COOKIES.get(self.cookie_name)
+        self.cart_dict = cart_codec.loads(cart) if cart else {}
+
+    def items(self):
+        return self.cart_dict
+
+    def selected_items(self):
+        return {sku_id: item['count'] for sku_id, item in self.cart_dict.items() if item['selected']}
+
+    def summary(self):
+        return summarize(self.cart_dict)
+
+    def add(self, sku_id, count, selected=True):
+        if sku_id in self.cart_dict:
+            # 如果已经有该商品了,就将数量相加
+            self.cart_dict[sku_id]['count'] += count
+            if selected:
+                self.cart_dict[sku_id]['selected'] = True
+        else:
+            self.cart_dict[sku_id] = {
+                'count': count,
+                'selected': selected
+            }
+        return self.cart_dict[sku_id]['count']
+
+    def update(self, sku_id, count, selected):
+        if sku_id in self.cart_dict:
+            self.cart_dict[sku_id] = {
+                'count': count,
+                'selected': selected
+            }
+        return 1
+
+    def select(self, sku_id, selected):
+        if sku_id not in self.cart_dict:
+            return 0
+        self.cart_dict[sku_id]['selected'] = selected
+        return 1
+
+    def select_all(self, selected):
+        for sku_id in self.cart_dict:
+            self.cart_dict[sku_id]['selected'] = selected
+        return len(self.cart_dict)
+
+    def delete(self, *sku_ids):
+        deleted = 0
+        for sku_id in sku_ids:
+            if self.cart_dict.pop(sku_id, None) is not None:
+                deleted += 1
+        return deleted
+
+    def apply(self, operations):
+        return [getattr(self, operation['op'])(*operation_args(operation)) for operation in operations]
+
+    def save(self, response):
+        cart_str = cart_codec.dumps(self.cart_dict)
+        response.set_cookie(self.cookie_name, cart_str, max_age=CART_COOKIE_EXPIRES)
+        return response
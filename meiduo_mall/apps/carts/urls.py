@@ -3,4 +3,7 @@ from . import views
 
 urlpatterns = [
     url('^cart/$', views.CartView.as_view()),
+    url('^cart/selection/$', views.CartSelectAllView.as_view()),
+    url('^cart/batch/$', views.CartBatchView.as_view()),
+    url('^cart/summary/$', views.CartSummaryView.as_view()),
 ]
@@ -1,5 +1,26 @@
-from django_redis import get_redis_connection
-from utils import meiduopickle
+from django.conf import settings
+from .storage import RedisCart, TokenCart, CookieCart
+
+
+def get_cart(request):
+    """
+    获取当前请求的购物车
+    登录用户的购物车保存在redis中,未登录用户根据CART_ANONYMOUS_STORAGE保存在cookie或redis中
+    :param request: 请求对象
+    :return: 购物车对象,修改后调用save(response)
+    """
+    try:
+        user = request.user
+    except:
+        user = None
+
+    if user is not None and user.is_authenticated:
+        return RedisCart(user.id)
+
+    if settings.CART_ANONYMOUS_STORAGE == 'token':
+        return TokenCart.from_request(request) or TokenCart()
+
+    return CookieCart(request)
 
 
 # 获取cookie信息
@@ -11,27 +32,19 @@ def merge_cart_cookie2redis(request, response, user_id):
     :param user_id:当前登录的用户的id
     :return:response
     """
+    cart = RedisCart(user_id)
+
+    # 令牌方式保存的购物车,直接在redis中合并
+    token_cart = TokenCart.from_request(request)
+    if token_cart is not None:
+        cart.merge_cart(token_cart)
+        response.delete_cookie(TokenCart.cookie_name)
+
     # 读取cookie
-    cart = request.COOKIES.get('cart')
-    if not cart:
-        return response
-    cart_dict = meiduopickle.loads(cart)
-
-    # 向redis中写入数据
-    # 连接redis
-    redis_cli = get_redis_connection('carts')
-
-    # 遍历数据
-    for sku_id, item in cart_dict.items():
-        # 向redis-hash中写入数据
-        redis_cli.hset('cart%d' % user_id, sku_id, item.get('count'))
-        # 向set中写选中状态,
-        if item.get('selected'):
-            redis_cli.sadd('cart_selected%d' % user_id, sku_id)
-        else:
-            redis_cli.srem('cart_selected%d' % user_id, sku_id)
-
-    # 删除cookie中的数据
-    response.delete_cookie('cart')
+    if request.COOKIES.get(CookieCart.cookie_name):
+        # 向redis中写入数据,数量与选中状态在一次交互中全部写入
+        cart.merge(CookieCart(request).items())
+        # 删除cookie中的数据
+        response.delete_cookie(CookieCart.cookie_name)
 
     return response
@@ -1,11 +1,10 @@
-from rest_framework import serializers, status
+from rest_framework import status
 from rest_framework.response import Response
-from .serializers import CartSerializer, CartSKUSerializer, CartDeleteSerializer, CartSelectAllSerializer
+from .serializers import CartSerializer, CartSKUSerializer, CartDeleteSerializer, CartSelectAllSerializer, \
+    CartBatchSerializer, CartSummarySerializer
 from rest_framework.views import APIView
-from utils import meiduopickle
-from .constants import CART_COOKIE_EXPIRES
-from goods.models import SKU
-from django_redis import get_redis_connection
+from goods.utils import get_sku_cards
+from .utils import get_cart
 
 
 class CartView(APIView):
@@ -31,43 +30,15 @@ class CartView(APIView):
         # 获取验证后的数据
         sku_id = serializer.validated_data.get('sku_id')
         count = serializer.validated_data.get('count')
-
-        # 保存,验证用户
-        try:
-            user = request.user
-        except:
-            user = None
+        selected = serializer.validated_data.get('selected')
 
         response = Response(serializer.validated_data)
 
-        if user is None:
-            # 读取购物车中的信息
-            cart = request.COOKIES.get('cart')
-            # 判断购物车中是否有数据
-            if cart:
-                cart_dict = meiduopickle.loads(cart)
-            else:
-                cart_dict = {}
-            # 判断购物车中是否有此商品
-            if sku_id in cart_dict:
-                # 如果已经有该商品了,就将数量相加
-                count_cart = cart_dict.get(sku_id).get('count')
-                cart_dict[sku_id]['count'] = count + count_cart
-            else:
-                # 如果没有该商品,就保存在cookie中
-                cart_dict[sku_id] = {
-                    'count': count,
-                    'selected': True
-                }
-
-            cart_str = meiduopickle.dumps(cart_dict)
-            response.set_cookie('cart', cart_str, max_age=CART_COOKIE_EXPIRES)
-        else:
-            # 用户登录,将数据存入redis
-            redis_cli = get_redis_connection('carts')
-            redis_cli.hincrby('cart%d' % user.id, sku_id, count)
-
-        return response
+        # 根据是否登录获取购物车,已经有该商品时数量相加
+        cart = get_cart(request)
+        cart.add(sku_id, count, selected)
+
+        return cart.save(response)
 
     def get(self, request):
         """
@@ -75,44 +46,15 @@ class CartView(APIView):
         :param request: 无
         :return: id, count, selected, price, name, default_image_url
         """
-        # 验证用户是否登录
-        try:
-            user = request.user
-        except:
-            user = None
-
-        if user is None:
-            # 没有登录,从cookie中读取数据
-            cart = request.COOKIES.get('cart')
-            if cart:
-                cart_dict = meiduopickle.loads(cart)
-            else:
-                cart_dict = {}
-
-        else:
-            # 登录了,从 redis 中读取数据
-            redis_cli = get_redis_connection('carts')
-            cart_redis = redis_cli.hgetall('cart%d' % user.id)
-
-            cart_dict = {}
-
-            for sku_id in cart_redis:
-                cart_dict[int(sku_id)] = {
-                    'count': int(cart_redis[sku_id])
-                }
-            cart_selected = redis_cli.smembers('cart_selected%d' % user.id)
-            cart_selected = [int(sku_id) for sku_id in cart_selected]
-            for sku_id in cart_dict:
-                if sku_id in cart_selected:
-                    cart_dict[sku_id]['selected'] = True
-                else:
-                    cart_dict[sku_id]['selected'] = False
-
-        skus = SKU.objects.filter(id__in=cart_dict.keys())
-        for sku in skus:
-            sku_dict = cart_dict.get(sku.id)
-            sku.count = sku_dict.get('count')
-            sku.selected = sku_dict.get('selected')
+        # 登录了从redis中读取数据,没有登录从cookie或令牌对应的redis中读取数据
+        cart_dict = get_cart(request).items()
+
+        # 从缓存中批量读取商品信息
+        cards = get_sku_cards(cart_dict.keys())
+        skus = []
+        for sku_id, sku_dict in cart_dict.items():
+            if sku_id in cards:
+                skus.append(dict(cards[sku_id], count=sku_dict.get('count'), selected=sku_dict.get('selected')))
 
         serializer = CartSKUSerializer(skus, many=True)
 
@@ -133,38 +75,11 @@ class CartView(APIView):
 
         response = Response(serializer.validated_data)
 
-        try:
-            user = request.user
-        except:
-            user = None
-
-        if user is None:
-            # 没有登录,从cookie中获取值
-            cart = request.COOKIES.get('cart')
-            if not cart:
-                raise serializers.ValidationError('购物车里什么都没有')
+        # 修改数量与选中状态
+        cart = get_cart(request)
+        cart.update(sku_id, count, selected)
 
-            cart_dict = meiduopickle.loads(cart)
-
-            if sku_id in cart_dict:
-                cart_dict[sku_id] = {
-                    'count': count,
-                    'selected': selected
-                }
-            cart_str = meiduopickle.dumps(cart_dict)
-            response.set_cookie('cart', cart_str, max_age=CART_COOKIE_EXPIRES)
-
-        else:
-            # 登录了,从redis中获取值
-            redis_cli = get_redis_connection('carts')
-            redis_cli.hset('cart%d' % user.id, sku_id, count)
-
-            if selected:
-                redis_cli.sadd('cart_selected%d' % user.id, sku_id)
-            else:
-                redis_cli.srem('cart_selected%d' % user.id, sku_id)
-
-        return response
+        return cart.save(response)
 
     def delete(self, request):
         """
@@ -176,26 +91,12 @@ class CartView(APIView):
         serializer.is_valid(raise_exception=True)
         sku_id = serializer.validated_data.get('sku_id')
 
-        try:
-            user = request.user
-        except:
-            user = None
-
         response = Response(status=status.HTTP_204_NO_CONTENT)
 
-        if user is None:
-            cart = request.COOKIES.get('cart')
-            if not cart:
-                raise serializers.ValidationError('购物车无数据，不需要删除')
-            cart_dict = meiduopickle.loads(cart)
-            if sku_id in cart_dict:
-                del cart_dict[sku_id]
-            cart_str = meiduopickle.dumps(cart_dict)
-            response.set_cookie('cart', cart_str, max_age=CART_COOKIE_EXPIRES)
-        else:
-            pass
+        cart = get_cart(request)
+        cart.delete(sku_id)
 
-        return response
+        return cart.save(response)
 
 
 class CartSelectAllView(APIView):
@@ -216,30 +117,54 @@ class CartSelectAllView(APIView):
         serializer.is_valid(raise_exception=True)
         selected = serializer.validated_data.get('selected')
 
-        try:
-            user = request.user
-        except:
-            user = None
+        response = Response({'message': 'OK'})
+
+        cart = get_cart(request)
+        cart.select_all(selected)
+
+        return cart.save(response)
+
+
+class CartBatchView(APIView):
+    """
+    批量修改购物车
+    """
+    def perform_authentication(self, request):
+        # 去掉rest_framework自带的身份验证功能
+        pass
+
+    def post(self, request):
+        """
+        一次执行多个添加、修改、选中、删除操作
+        登录用户与令牌购物车只与redis交互一次,cookie购物车只重新编码一次
+        :param request: operations: [{op, sku_id, count, selected}, ...]
+        :return: 无
+        """
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        operations = serializer.validated_data.get('operations')
 
         response = Response({'message': 'OK'})
 
-        if user is None:
-            cart = request.COOKIES.get('cart')
-            if not cart:
-                raise serializers.ValidationError('暂无购物车数据')
-            cart_dict = meiduopickle.loads(cart)
-            for sku_id in cart_dict:
-                cart_dict[sku_id]['selected'] = selected
-            cart_str = meiduopickle.dumps(cart_dict)
-            response.set_cookie('cart', cart_str, max_age=CART_COOKIE_EXPIRES)
-        else:
-            redis_cli = get_redis_connection('carts')
-            sku_ids = redis_cli.hkeys('cart%d' % user.id)
-            if selected:
-                redis_cli.sadd('cart_selected%d' % user.id, *sku_ids)
-            else:
-                redis_cli.srem('cart_selected%d' % user.id, *sku_ids)
-
-        return response
+        cart = get_cart(request)
+        cart.apply(operations)
+
+        return cart.save(response)
 
 
+class CartSummaryView(APIView):
+    """
+    购物车汇总
+    """
+    def perform_authentication(self, request):
+        # 去掉rest_framework自带的身份验证功能
+        pass
+
+    def get(self, request):
+        """
+        获取购物车的商品总数、选中数量与选中金额,不读取商品信息
+        :param request: 无
+        :return: count, selected_count, selected_amount
+        """
+        serializer = CartSummarySerializer(get_cart(request).summary())
+        return Response(serializer.data)
@@ -1,9 +1,32 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
 from . import models
 from celery_tasks.html.tasks import generate_static_sku_detail_html
+from orders.sales import merge_pending_sales
+
+
+class PendingSalesChangeList(ChangeList):
+    """
+    列表页显示的销量加上redis中还没有同步到mysql的部分,整页一次读取
+    """
+    def get_results(self, request):
+        super().get_results(request)
+        self.result_list = merge_pending_sales(list(self.result_list))
+
+
+class GoodsAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'brand', 'sales', 'comments']
+
+    def get_changelist(self, request, **kwargs):
+        return PendingSalesChangeList
 
 
 class SKUAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'price', 'stock', 'sales', 'is_launched']
+
+    def get_changelist(self, request, **kwargs):
+        return PendingSalesChangeList
+
     def save_model(self, request, obj, form, change):
         obj.save()
         generate_static_sku_detail_html.delay(obj.id)
@@ -35,7 +58,7 @@ class SKUImageAdmin(admin.ModelAdmin):
 
 admin.site.register(models.GoodsCategory)
 admin.site.register(models.GoodsChannel)
-admin.site.register(models.Goods)
+admin.site.register(models.Goods, GoodsAdmin)
 admin.site.register(models.Brand)
 admin.site.register(models.GoodsSpecification)
 admin.site.register(models.SpecificationOption)
@@ -0,0 +1,14 @@
+# 商品卡片缓存的有效期
+SKU_CARD_CACHE_EXPIRES = 60 * 60
+
+# 商品分类菜单在redis中缓存的有效期,类别或频道修改后立即失效
+CATEGORIES_CACHE_EXPIRES = 60 * 60 * 24
+
+# 商品列表筛选的价格区间的下限,最后一个区间没有上限
+FACET_PRICE_BANDS = (0, 100, 500, 1000, 2000, 5000, 10000)
+
+# 进程内的筛选索引重新构建的间隔(秒),用于更新批量修改的销量
+FACET_INDEX_EXPIRES = 10 * 60
+
+# 保留最近多少个版本的商品修改记录,落后更多版本的进程重新构建索引
+FACET_CHANGES_KEEP = 10000
@@ -0,0 +1,271 @@
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from django.db.models import F
+from django_redis import get_redis_connection
+from utils.redis_script import get_script
+from .models import SKU, SKUSpecification
+from . import constants, scripts
+
+# 商品筛选索引的版本,商品、规格、品牌修改后加1
+FACET_VERSION_KEY = 'goods_facets_version'
+# zset, 修改过的商品编号,分数为修改后的版本
+FACET_CHANGES_KEY = 'goods_facets_changes'
+# 修改记录中的这个成员表示所有进程需要重新构建索引
+FACET_CHANGE_ALL = 'all'
+
+# 进程内的类别索引, {category_id: CategoryFacetIndex}, 使用_lock保护
+_indexes = {}
+# 进程内的索引对应的版本
+_version = None
+_lock = threading.Lock()
+
+
+def popcount(bitmap):
+    """
+    位图中1的数量
+    """
+    return bin(bitmap).count('1')
+
+
+def get_price_band(price):
+    """
+    :return: 价格所在区间的序号
+    """
+    return max(bisect_right(constants.FACET_PRICE_BANDS, price) - 1, 0)
+
+
+def load_skus(**filters):
+    """
+    查询建立索引需要的商品数据,商品与规格各查询一次
+    :param filters: 商品的查询条件
+    :return: {sku_id: {'id':, 'category_id':, 'is_launched':, 'price':, 'sales':, 'create_time':,
+                       'brand_id':, 'brand_name':, 'specs': [(规格名称, 选项值), ...]}}
+    """
+    skus = OrderedDict()
+    for sku in SKU.objects.filter(**filters).order_by('id').values(
+            'id', 'category_id', 'is_launched', 'price', 'sales', 'create_time',
+            brand_id=F('goods__brand_id'), brand_name=F('goods__brand__name')):
+        sku['specs'] = []
+        skus[sku['id']] = sku
+
+    spec_filters = {'sku__' + key: value for key, value in filters.items()}
+    for sku_id, name, value in SKUSpecification.objects.filter(**spec_filters).order_by(
+            'spec_id', 'option_id').values_list('sku_id', 'spec__name', 'option__value'):
+        if sku_id in skus:
+            skus[sku_id]['specs'].append((name, value))
+    return skus
+
+
+class CategoryFacetIndex(object):
+    """
+    一个类别中上架商品的筛选索引
+    每个商品在类别中有一个位置,品牌、规格选项、价格区间各有一个位图,第n位为1表示第n个位置的商品符合
+    位置按照加入的顺序连续分配,位图的大小只与类别中的商品数量有关
+    """
+    def __init__(self, category_id):
+        self.category_id = category_id
+        self.build_time = time.time()
+        # sku_id -> 位置
+        self.slots = {}
+        # 位置 -> 商品数据, 移除的商品为None
+        self.items = []
+        # 类别中的全部商品
+        self.all = 0
+        # {brand_id: 位图}
+        self.brands = {}
+        self.brand_names = {}
+        # {规格名称: {选项值: 位图}}
+        self.specs = OrderedDict()
+        # 每个价格区间一个位图
+        self.prices = [0] * len(constants.FACET_PRICE_BANDS)
+        # 按照各种排序方式排列的位置, {ordering: [位置]}
+        self.sorted_slots = {}
+
+    def add(self, sku):
+        self.remove(sku['id'])
+        slot = len(self.items)
+        self.items.append(sku)
+        self.slots[sku['id']] = slot
+        bit = 1 << slot
+
+        self.all |= bit
+        self.brands[sku['brand_id']] = self.brands.get(sku['brand_id'], 0) | bit
+        self.brand_names[sku['brand_id']] = sku['brand_name']
+        for name, value in sku['specs']:
+            options = self.specs.setdefault(name, OrderedDict())
+            options[value] = options.get(value, 0) | bit
+        self.prices[get_price_band(sku['price'])] |= bit
+        self.sorted_slots.clear()
+
+    def remove(self, sku_id):
+        slot = self.slots.pop(sku_id, None)
+        if slot is None:
+            return
+        sku = self.items[slot]
+        self.items[slot] = None
+        mask = ~(1 << slot)
+
+        self.all &= mask
+        self.brands[sku['brand_id']] &= mask
+        for name, value in sku['specs']:
+            self.specs[name][value] &= mask
+        self.prices[get_price_band(sku['price'])] &= mask
+        self.sorted_slots.clear()
+
+    def get_sorted_slots(self, ordering):
+        """
+        :param ordering: 排序字段,可以带-表示降序,相同时按照商品编号排序
+        :return: 排好序的位置列表,修改索引前多次查询共用
+        """
+        slots = self.sorted_slots.get(ordering)
+        if slots is None:
+            name = ordering.lstrip('-')
+            slots = sorted((slot for slot, sku in enumerate(self.items) if sku is not None),
+                           key=lambda slot: (self.items[slot][name], self.items[slot]['id']),
+                           reverse=ordering.startswith('-'))
+            self.sorted_slots[ordering] = slots
+        return slots
+
+    def search(self, brands=(), specs=None, prices=(), ordering='-create_time', offset=0, limit=5):
+        """
+        按照筛选条件查询一页商品编号,并统计每个筛选项的商品数量
+        同一组中的条件满足任意一个即可,不同组的条件需要同时满足
+        统计一组筛选项的数量时不使用这一组自己的条件,选中一个品牌后其它品牌的数量不会变为0
+        :param brands: 品牌编号
+        :param specs: {规格名称: [选项值]}
+        :param prices: 价格区间序号
+        :return: (符合条件的商品数量, 本页的商品编号, 筛选项)
+        """
+        def union(bitmaps):
+            result = 0
+            for bitmap in bitmaps:
+                result |= bitmap
+            return result
+
+        masks = OrderedDict()
+        if brands:
+            masks['brand'] = union(self.brands.get(brand_id, 0) for brand_id in brands)
+        for name, values in (specs or {}).items():
+            options = self.specs.get(name, {})
+            masks['spec', name] = union(options.get(value, 0) for value in values)
+        if prices:
+            masks['price'] = union(self.prices[band] for band in prices if 0 <= band < len(self.prices))
+
+        def matched(exclude=None):
+            result = self.all
+            for key, mask in masks.items():
+                if key != exclude:
+                    result &= mask
+            return result
+
+        result = matched()
+        count = popcount(result)
+
+        sku_ids = []
+        if offset < count:
+            # 转换为字节后每次判断只读取一个字节,不对整个位图做移位
+            bits = result.to_bytes((len(self.items) + 7) // 8 or 1, 'little')
+            skipped = 0
+            for slot in self.get_sorted_slots(ordering):
+                if not bits[slot >> 3] >> (slot & 7) & 1:
+                    continue
+                if skipped < offset:
+                    skipped += 1
+                    continue
+                sku_ids.append(self.items[slot]['id'])
+                if len(sku_ids) >= limit:
+                    break
+
+        base = matched('brand')
+        facets = OrderedDict()
+        facets['brands'] = [{'id': brand_id, 'name': self.brand_names[brand_id], 'count': popcount(base & bitmap)}
+                            for brand_id, bitmap in sorted(self.brands.items()) if bitmap]
+        facets['specs'] = []
+        for name, options in self.specs.items():
+            base = matched(('spec', name))
+            options = [{'value': value, 'count': popcount(base & bitmap)}
+                       for value, bitmap in options.items() if bitmap]
+            if options:
+                facets['specs'].append({'name': name, 'options': options})
+        base = matched('price')
+        bands = constants.FACET_PRICE_BANDS
+        facets['prices'] = [{'band': band, 'min': bands[band], 'max': bands[band + 1] if band + 1 < len(bands) else None,
+                             'count': popcount(base & bitmap)}
+                            for band, bitmap in enumerate(self.prices) if bitmap]
+        return count, sku_ids, facets
+
+
+def build_category_index(category_id):
+    """
+    从数据库构建一个类别的筛选索引,只查询两次
+    """
+    index = CategoryFacetIndex(category_id)
+    for sku in load_skus(category_id=category_id, is_launched=True).values():
+        index.add(sku)
+    return index
+
+
+def sync_indexes():
+    """
+    根据redis中的修改记录更新进程内的索引,只与redis交互一次,需要持有_lock
+    修改过的商品重新查询后从所有索引中移除,再加入当前类别的索引
+    落后太多版本或者修改记录中有all时清空进程内的索引
+    """
+    global _version
+    redis_cli = get_redis_connection('default')
+    pl = redis_cli.pipeline()
+    pl.get(FACET_VERSION_KEY)
+    pl.zrangebyscore(FACET_CHANGES_KEY, '(%d' % _version if _version is not None else '+inf', '+inf')
+    version, changes = pl.execute()
+    version = int(version or 0)
+    if version == _version:
+        return
+
+    changes = {change.decode() for change in changes}
+    if (_version is None or version < _version or version - _version > constants.FACET_CHANGES_KEEP
+            or FACET_CHANGE_ALL in changes):
+        _indexes.clear()
+    elif _indexes and changes:
+        sku_ids = [int(sku_id) for sku_id in changes]
+        skus = load_skus(id__in=sku_ids)
+        for index in _indexes.values():
+            for sku_id in sku_ids:
+                index.remove(sku_id)
+        for sku in skus.values():
+            index = _indexes.get(sku['category_id'])
+            if index is not None and sku['is_launched']:
+                index.add(sku)
+    _version = version
+
+
+def search_category(category_id, **kwargs):
+    """
+    使用进程内的筛选索引查询一个类别中的商品,参数与CategoryFacetIndex.search相同
+    索引不存在或者超过FACET_INDEX_EXPIRES时重新构建
+    :return: (符合条件的商品数量, 本页的商品编号, 筛选项)
+    """
+    category_id = int(category_id)
+    with _lock:
+        sync_indexes()
+        index = _indexes.get(category_id)
+        if index is None or time.time() - index.build_time > constants.FACET_INDEX_EXPIRES:
+            index = build_category_index(category_id)
+            # 不保存没有商品的类别,避免不存在的类别编号占用内存
+            if index.all:
+                _indexes[category_id] = index
+        return index.search(**kwargs)
+
+
+def record_facet_changes(*sku_ids):
+    """
+    记录修改过的商品,所有进程在下次查询时更新索引
+    :param sku_ids: 商品编号, 传入FACET_CHANGE_ALL时所有进程重新构建索引
+    """
+    if not sku_ids:
+        return
+    redis_cli = get_redis_connection('default')
+    get_script(redis_cli, scripts.FACET_CHANGES_ADD)(
+        keys=[FACET_VERSION_KEY, FACET_CHANGES_KEY], args=[constants.FACET_CHANGES_KEEP] + list(sku_ids),
+        client=redis_cli)
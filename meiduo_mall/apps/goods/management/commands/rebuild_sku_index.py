@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from goods.utils import rebuild_launched_skus
+
+
+class Command(BaseCommand):
+    """
+    根据数据库重建上架商品的位图
+    """
+    help = '重建上架商品索引'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=1000, help='每批写入redis的商品数量')
+
+    def handle(self, *args, **options):
+        total = rebuild_launched_skus(options['batch'])
+        self.stdout.write('共有%d个上架商品' % total)
@@ -0,0 +1,24 @@
+from .utils import get_sku_cards
+
+
+class SKUCardPrefetchMixin(object):
+    """
+    序列化整页数据时,一次批量读取本页所有商品的卡片,通过sku_cards传给序列化器
+    子类实现get_page_sku_ids,序列化器使用SKUCardSerializerMixin读取
+    """
+    def get_page_sku_ids(self, page):
+        """
+        :param page: 本页的数据
+        :return: 本页用到的商品编号
+        """
+        raise NotImplementedError
+
+    def get_serializer(self, *args, **kwargs):
+        if args and kwargs.get('many'):
+            self.sku_cards = get_sku_cards(self.get_page_sku_ids(args[0]))
+        return super().get_serializer(*args, **kwargs)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['sku_cards'] = getattr(self, 'sku_cards', None)
+        return context
@@ -135,6 +135,12 @@ class SKU(BaseModel):
         db_table = 'tb_sku'
         verbose_name = '商品SKU'
         verbose_name_plural = verbose_name
+        # 商品列表按类别筛选上架商品后排序分页
+        indexes = [
+            models.Index(fields=['category', 'is_launched', 'create_time', 'id'], name='sku_cat_launched_time_idx'),
+            models.Index(fields=['category', 'is_launched', 'price', 'id'], name='sku_cat_launched_price_idx'),
+            models.Index(fields=['category', 'is_launched', 'sales', 'id'], name='sku_cat_launched_sales_idx'),
+        ]
 
     def __str__(self):
         return '%s: %s' % (self.id, self.name)
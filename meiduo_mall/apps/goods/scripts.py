@@ -0,0 +1,16 @@
+"""
+商品redis的lua脚本
+"""
+
+# 记录修改过的商品,更新筛选索引的版本
+# KEYS[1]: 筛选索引的版本, KEYS[2]: 修改记录zset, 成员为商品编号(或all), 分数为修改后的版本
+# ARGV[1]: 保留最近多少个版本的修改记录, ARGV[2...]: 修改的商品编号
+# 返回修改后的版本
+FACET_CHANGES_ADD = """
+local version = redis.call('incr', KEYS[1])
+for i = 2, #ARGV do
+    redis.call('zadd', KEYS[2], version, ARGV[i])
+end
+redis.call('zremrangebyscore', KEYS[2], '-inf', version - tonumber(ARGV[1]))
+return version
+"""
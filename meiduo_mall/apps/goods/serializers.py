@@ -1,7 +1,9 @@
+from collections import OrderedDict
 from rest_framework import serializers
 from .models import SKU
 from drf_haystack.serializers import HaystackSerializer
 from .search_indexes import SKUIndex
+from .utils import get_sku_cards
 
 
 class SKUSerializer(serializers.ModelSerializer):
@@ -14,11 +16,28 @@ class SKUSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'price', 'default_image_url', 'comments')
 
 
-class SKUIndexSerializer(HaystackSerializer):
+class SKUCardSerializerMixin(object):
+    """
+    使用视图通过SKUCardPrefetchMixin批量读取的商品卡片,单独序列化时读取一个商品的卡片
+    """
+    def get_sku_card_data(self, sku_id):
+        """
+        :return: 商品卡片的序列化数据,商品不存在时返回None
+        """
+        cards = self.context.get('sku_cards')
+        if cards is None:
+            cards = get_sku_cards([sku_id])
+        card = cards.get(sku_id)
+        if card is None:
+            return None
+        return SKUSerializer(card).data
+
+
+class SKUIndexSerializer(SKUCardSerializerMixin, HaystackSerializer):
     """
     SKU索引结果数据序列化器
     """
-    object = SKUSerializer(read_only=True)
+    object = serializers.SerializerMethodField()
 
     class Meta:
         index_classes = [SKUIndex]
@@ -26,3 +45,31 @@ class SKUIndexSerializer(HaystackSerializer):
             'text',  # 用于接收查询关键字
             'object'  # 用于返回查询结果
         )
+
+    def get_object(self, result):
+        """
+        使用商品卡片缓存填充查询结果
+        """
+        return self.get_sku_card_data(int(result.pk))
+
+
+class SKUFacetQuerySerializer(serializers.Serializer):
+    """
+    商品列表的筛选条件
+    brand=品牌编号, spec=规格名称:选项值, price=价格区间序号, 都可以传多个
+    """
+    brand = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    spec = serializers.ListField(child=serializers.CharField(), required=False, default=list)
+    price = serializers.ListField(child=serializers.IntegerField(min_value=0), required=False, default=list)
+
+    def validate_spec(self, value):
+        """
+        转换为 {规格名称: [选项值]}
+        """
+        specs = OrderedDict()
+        for item in value:
+            name, sep, option = item.partition(':')
+            if not sep:
+                raise serializers.ValidationError('规格格式错误')
+            specs.setdefault(name, []).append(option)
+        return specs
@@ -0,0 +1,74 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import GoodsCategory, GoodsChannel, SKU, Goods, Brand, GoodsSpecification, SpecificationOption, \
+    SKUSpecification
+from .utils import delete_sku_card, set_sku_launched, bump_categories_version
+from .facets import record_facet_changes, FACET_CHANGE_ALL
+
+
+@receiver([post_save, post_delete], sender=SKU)
+def sku_changed(sender, instance, **kwargs):
+    """
+    商品保存或删除后,在事务提交时删除缓存的商品卡片
+    后台的SKUAdmin.save_model与SKUImageAdmin修改默认图片时都会触发
+    """
+    sku_id = instance.id
+    transaction.on_commit(lambda: delete_sku_card(sku_id))
+
+
+@receiver(post_save, sender=SKU)
+def sku_saved(sender, instance, **kwargs):
+    """
+    商品新增或上下架后修改上架商品的位图
+    """
+    sku_id, launched = instance.id, instance.is_launched
+    transaction.on_commit(lambda: set_sku_launched(sku_id, launched))
+
+
+@receiver(post_delete, sender=SKU)
+def sku_deleted(sender, instance, **kwargs):
+    """
+    商品删除后从上架商品的位图中移除
+    """
+    sku_id = instance.id
+    transaction.on_commit(lambda: set_sku_launched(sku_id, False))
+
+
+@receiver([post_save, post_delete], sender=GoodsCategory)
+@receiver([post_save, post_delete], sender=GoodsChannel)
+def category_changed(sender, instance, **kwargs):
+    """
+    类别或频道修改后,在事务提交时更新商品分类菜单的版本
+    """
+    transaction.on_commit(bump_categories_version)
+
+
+@receiver([post_save, post_delete], sender=SKU)
+@receiver([post_save, post_delete], sender=SKUSpecification)
+def facet_sku_changed(sender, instance, **kwargs):
+    """
+    商品或商品的规格修改后,在事务提交时记录到筛选索引的修改记录
+    """
+    sku_id = instance.id if sender is SKU else instance.sku_id
+    transaction.on_commit(lambda: record_facet_changes(sku_id))
+
+
+@receiver(post_save, sender=Goods)
+def facet_goods_saved(sender, instance, **kwargs):
+    """
+    SPU修改后品牌可能改变,记录它的所有商品
+    """
+    goods_id = instance.id
+    transaction.on_commit(
+        lambda: record_facet_changes(*SKU.objects.filter(goods_id=goods_id).values_list('id', flat=True)))
+
+
+@receiver([post_save, post_delete], sender=Brand)
+@receiver([post_save, post_delete], sender=GoodsSpecification)
+@receiver([post_save, post_delete], sender=SpecificationOption)
+def facet_names_changed(sender, instance, **kwargs):
+    """
+    品牌、规格的名称修改后所有类别的索引重新构建
+    """
+    transaction.on_commit(lambda: record_facet_changes(FACET_CHANGE_ALL))
@@ -1,10 +1,25 @@
 from collections import OrderedDict
-from .models import GoodsChannel
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from utils.redis_script import get_script
+from .models import GoodsCategory, GoodsChannel, SKU
+from . import constants
 
+# 商品卡片包含的字段,购物车、结算、浏览记录、搜索结果都使用这些字段
+SKU_CARD_FIELDS = ('id', 'name', 'price', 'default_image_url', 'comments')
 
-def get_categories():
+
+# 商品分类菜单的版本,类别或频道修改后加1,缓存的菜单随之失效
+CATEGORIES_VERSION_KEY = 'goods_categories_version'
+CATEGORIES_CACHE_KEY = 'goods_categories_%d'
+
+# 进程内缓存的菜单, (版本, 菜单)
+_categories = None
+
+
+def build_categories():
     """
-    获取商城商品分类菜单
+    构建商城商品分类菜单,只查询频道与类别两次,在内存中组装
     :return 菜单字典
     """
     # 商品频道及分类菜单
@@ -18,26 +33,167 @@ def get_categories():
     #
     #     }
     # }
+    cats = OrderedDict()
+    children = {}
+    for cat in GoodsCategory.objects.order_by('id').values('id', 'name', 'parent_id'):
+        cats[cat['id']] = cat
+        children.setdefault(cat['parent_id'], []).append(cat)
+
     categories = OrderedDict()
-    channels = GoodsChannel.objects.order_by('group_id', 'sequence')
-    for channel in channels:
-        group_id = channel.group_id  # 当前组
+    for channel in GoodsChannel.objects.order_by('group_id', 'sequence').values('group_id', 'category_id', 'url'):
+        group_id = channel['group_id']  # 当前组
+        cat1 = cats.get(channel['category_id'])  # 当前频道的类别
+        if cat1 is None:
+            continue
 
         if group_id not in categories:
             categories[group_id] = {'channels': [], 'sub_cats': []}
 
-        cat1 = channel.category  # 当前频道的类别
-
         # 追加当前频道
         categories[group_id]['channels'].append({
-            'id': cat1.id,
-            'name': cat1.name,
-            'url': channel.url
+            'id': cat1['id'],
+            'name': cat1['name'],
+            'url': channel['url']
         })
         # 构建当前类别的子类别
-        for cat2 in cat1.goodscategory_set.all():
-            cat2.sub_cats = []
-            for cat3 in cat2.goodscategory_set.all():
-                cat2.sub_cats.append(cat3)
-            categories[group_id]['sub_cats'].append(cat2)
+        for cat2 in children.get(cat1['id'], []):
+            categories[group_id]['sub_cats'].append({
+                'id': cat2['id'],
+                'name': cat2['name'],
+                'sub_cats': [{'id': cat3['id'], 'name': cat3['name']} for cat3 in children.get(cat2['id'], [])]
+            })
     return categories
+
+
+def get_categories():
+    """
+    获取商城商品分类菜单,依次使用进程内缓存、redis缓存,都没有时重新构建
+    每次只读取一次菜单版本,类别或频道修改后版本变化,所有进程重新读取
+    返回的菜单在多次调用之间共用,不能修改
+    :return 菜单字典
+    """
+    global _categories
+    # 先读取版本再查询数据库,查询期间发生修改时新的版本会重新构建
+    version = int(get_redis_connection('default').get(CATEGORIES_VERSION_KEY) or 0)
+    if _categories is not None and _categories[0] == version:
+        return _categories[1]
+
+    key = CATEGORIES_CACHE_KEY % version
+    categories = cache.get(key)
+    if categories is None:
+        categories = build_categories()
+        cache.set(key, categories, constants.CATEGORIES_CACHE_EXPIRES)
+    _categories = (version, categories)
+    return categories
+
+
+def bump_categories_version():
+    """
+    商品类别或频道修改后使缓存的菜单失效
+    """
+    get_redis_connection('default').incr(CATEGORIES_VERSION_KEY)
+
+
+def get_sku_cards(sku_ids):
+    """
+    批量获取商品卡片
+    先从缓存中一次读取所有商品,未命中的商品通过一次查询从数据库读取并写入缓存
+    :param sku_ids: 商品编号
+    :return: {sku_id: {'id':, 'name':, 'price':, 'default_image_url':, 'comments':}}
+    """
+    keys = {'sku_card_%d' % int(sku_id): int(sku_id) for sku_id in sku_ids}
+    if not keys:
+        return {}
+
+    cards = {keys[key]: card for key, card in cache.get_many(keys.keys()).items()}
+
+    missing = [sku_id for sku_id in keys.values() if sku_id not in cards]
+    if missing:
+        fetched = {}
+        for card in SKU.objects.filter(id__in=missing).values(*SKU_CARD_FIELDS):
+            cards[card['id']] = card
+            fetched['sku_card_%d' % card['id']] = card
+        cache.set_many(fetched, constants.SKU_CARD_CACHE_EXPIRES)
+
+    return cards
+
+
+def delete_sku_card(sku_id):
+    """
+    商品修改后删除缓存的商品卡片
+    """
+    cache.delete('sku_card_%d' % sku_id)
+
+
+# 上架商品的位图,第sku_id位为1表示商品存在且已上架
+LAUNCHED_SKU_KEY = 'sku_launched'
+
+# 位图存在时才修改,避免在重建之前生成不完整的位图
+_SET_LAUNCHED_SCRIPT = """
+if redis.call('exists', KEYS[1]) == 1 then
+    return redis.call('setbit', KEYS[1], ARGV[1], ARGV[2])
+end
+return -1
+"""
+
+
+def get_launched_sku_ids(sku_ids):
+    """
+    批量判断商品是否存在且已上架,只与redis交互一次
+    位图还没有建立时查询数据库
+    :param sku_ids: 商品编号
+    :return: 已上架的商品编号集合
+    """
+    sku_ids = [int(sku_id) for sku_id in sku_ids]
+    if not sku_ids:
+        return set()
+
+    redis_cli = get_redis_connection('default')
+    pl = redis_cli.pipeline(transaction=False)
+    pl.exists(LAUNCHED_SKU_KEY)
+    for sku_id in sku_ids:
+        pl.getbit(LAUNCHED_SKU_KEY, sku_id)
+    result = pl.execute()
+
+    if not result[0]:
+        return set(SKU.objects.filter(id__in=sku_ids, is_launched=True).values_list('id', flat=True))
+    return {sku_id for sku_id, bit in zip(sku_ids, result[1:]) if bit}
+
+
+def is_launched_sku(sku_id):
+    """
+    判断商品是否存在且已上架
+    """
+    return int(sku_id) in get_launched_sku_ids([sku_id])
+
+
+def set_sku_launched(sku_id, launched):
+    """
+    商品新增、删除、上下架后修改位图
+    """
+    redis_cli = get_redis_connection('default')
+    get_script(redis_cli, _SET_LAUNCHED_SCRIPT)(keys=[LAUNCHED_SKU_KEY], args=[sku_id, int(launched)], client=redis_cli)
+
+
+def rebuild_launched_skus(batch=1000):
+    """
+    根据数据库重建上架商品的位图,先写入临时键再替换,重建期间不影响读取
+    :return: 上架商品的数量
+    """
+    redis_cli = get_redis_connection('default')
+    tmp_key = LAUNCHED_SKU_KEY + '_tmp'
+    redis_cli.delete(tmp_key)
+    # 保证没有上架商品时位图也存在
+    redis_cli.setbit(tmp_key, 0, 0)
+
+    total = 0
+    pl = redis_cli.pipeline(transaction=False)
+    for sku_id in SKU.objects.filter(is_launched=True).values_list('id', flat=True).iterator():
+        pl.setbit(tmp_key, sku_id, 1)
+        total += 1
+        if total % batch == 0:
+            pl.execute()
+    pl.execute()
+
+    redis_cli.rename(tmp_key, LAUNCHED_SKU_KEY)
+    return total
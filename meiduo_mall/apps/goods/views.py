@@ -1,28 +1,117 @@
+from collections import OrderedDict
 from rest_framework.generics import ListAPIView
 from rest_framework.filters import OrderingFilter
-from .serializers import SKUSerializer
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+from .serializers import SKUSerializer, SKUFacetQuerySerializer
 from .models import SKU
 from drf_haystack.viewsets import HaystackViewSet
 from .serializers import SKUIndexSerializer
+from .utils import get_sku_cards
+from .mixins import SKUCardPrefetchMixin
+from .facets import search_category
+from utils.pagination import KeysetPagination
+
+# 请求中有这些参数时使用筛选索引查询
+FACET_QUERY_PARAMS = ('facets', 'brand', 'spec', 'price')
+
+
+class SKUListCursorPagination(KeysetPagination):
+    """
+    商品列表的游标分页,按照请求中的ordering排序,相同时按照id排序
+    使用SKU上(category_id, is_launched, 排序字段, id)的联合索引
+    """
+    ordering = ('-create_time', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        ordering = OrderingFilter().get_ordering(request, queryset, view)
+        if not ordering:
+            return self.ordering
+        # id与排序字段同向,可以顺着索引扫描
+        return ordering[0], '-id' if ordering[0].startswith('-') else 'id'
 
 
 class SKUListView(ListAPIView):
     """
     sku列表数据
+    请求中有cursor参数时(第一页传空值)使用游标分页,返回next与results,不统计总数量
+    请求中有筛选条件或facets参数时使用进程内的筛选索引,按页码分页,另外返回每个筛选项的商品数量
     """
     serializer_class = SKUSerializer
     filter_backends = (OrderingFilter,)
     ordering_fields = ('create_time', 'price', 'sales')
 
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if SKUListCursorPagination.cursor_query_param in self.request.query_params:
+                self._paginator = SKUListCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
     def get_queryset(self):
         category_id = self.kwargs['category_id']
         return SKU.objects.filter(category_id=category_id, is_launched=True)
 
+    def list(self, request, *args, **kwargs):
+        if not any(param in request.query_params for param in FACET_QUERY_PARAMS):
+            return super().list(request, *args, **kwargs)
+        return self.facet_list(request)
 
-class SKUSearchViewSet(HaystackViewSet):
+    def facet_list(self, request):
+        """
+        在筛选索引中查询一页商品编号与筛选项的数量,再通过商品卡片缓存读取本页的商品
+        """
+        serializer = SKUFacetQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        filters = serializer.validated_data
+
+        ordering = OrderingFilter().get_ordering(request, self.get_queryset(), self)
+        paginator = self.pagination_class()
+        page_size = paginator.get_page_size(request)
+        try:
+            page = int(request.query_params.get(paginator.page_query_param, 1))
+            if page < 1:
+                raise ValueError()
+        except ValueError:
+            raise NotFound('无效页面。')
+
+        count, sku_ids, facets = search_category(
+            self.kwargs['category_id'], brands=filters['brand'], specs=filters['spec'], prices=filters['price'],
+            ordering=ordering[0] if ordering else '-create_time', offset=(page - 1) * page_size, limit=page_size)
+        if page > 1 and not sku_ids:
+            raise NotFound('无效页面。')
+
+        cards = get_sku_cards(sku_ids)
+        results = SKUSerializer([cards[sku_id] for sku_id in sku_ids if sku_id in cards], many=True).data
+
+        url = request.build_absolute_uri()
+        next_link = replace_query_param(url, paginator.page_query_param, page + 1) \
+            if page * page_size < count else None
+        if page == 1:
+            previous_link = None
+        elif page == 2:
+            previous_link = remove_query_param(url, paginator.page_query_param)
+        else:
+            previous_link = replace_query_param(url, paginator.page_query_param, page - 1)
+        return Response(OrderedDict([
+            ('count', count),
+            ('next', next_link),
+            ('previous', previous_link),
+            ('results', results),
+            ('facets', facets),
+        ]))
+
+
+class SKUSearchViewSet(SKUCardPrefetchMixin, HaystackViewSet):
     """
     SKU搜索
     """
     index_models = [SKU]
 
     serializer_class = SKUIndexSerializer
+
+    def get_page_sku_ids(self, page):
+        return [result.pk for result in page]
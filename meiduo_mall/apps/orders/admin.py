@@ -1,3 +1,41 @@
 from django.contrib import admin
+from django.core.urlresolvers import reverse
+from django.http import HttpResponseRedirect
+from . import models
+from .archive import get_order
 
-# Register your models here.
+
+class OrderGoodsInline(admin.TabularInline):
+    model = models.OrderGoods
+    extra = 0
+
+
+class ArchivedOrderGoodsInline(admin.TabularInline):
+    model = models.ArchivedOrderGoods
+    extra = 0
+
+
+class OrderInfoAdmin(admin.ModelAdmin):
+    list_display = ['order_id', 'user', 'total_amount', 'pay_method', 'status', 'create_time']
+    list_filter = ['status']
+    search_fields = ['order_id']
+    raw_id_fields = ['user', 'address']
+    inlines = [OrderGoodsInline]
+
+    def change_view(self, request, object_id, form_url='', extra_context=None):
+        # 订单已经归档时转到归档订单的页面
+        if isinstance(get_order(object_id), models.ArchivedOrderInfo):
+            return HttpResponseRedirect(reverse('admin:orders_archivedorderinfo_change', args=[object_id]))
+        return super().change_view(request, object_id, form_url, extra_context)
+
+
+class ArchivedOrderInfoAdmin(admin.ModelAdmin):
+    list_display = ['order_id', 'user', 'total_amount', 'pay_method', 'status', 'create_time', 'archive_time']
+    list_filter = ['status']
+    search_fields = ['order_id', 'trade_id']
+    raw_id_fields = ['user', 'address']
+    inlines = [ArchivedOrderGoodsInline]
+
+
+admin.site.register(models.OrderInfo, OrderInfoAdmin)
+admin.site.register(models.ArchivedOrderInfo, ArchivedOrderInfoAdmin)
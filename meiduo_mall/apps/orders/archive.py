@@ -0,0 +1,67 @@
+from django.db import transaction
+from payments.models import Payment
+from .models import OrderInfo, OrderGoods, ArchivedOrderInfo, ArchivedOrderGoods
+
+# 可以归档的订单状态,归档后不再修改
+ARCHIVE_STATUSES = (OrderInfo.ORDER_STATUS_ENUM['FINISHED'], OrderInfo.ORDER_STATUS_ENUM['CANCELED'])
+
+
+def archivable_orders(before):
+    """
+    :param before: 在这个时间之前创建的订单
+    :return: 可以归档的订单
+    """
+    return OrderInfo.objects.filter(status__in=ARCHIVE_STATUSES, create_time__lt=before)
+
+
+def copy_fields(obj, exclude=()):
+    """
+    读取对象所有字段的值,用于创建归档对象
+    """
+    return {field.attname: getattr(obj, field.attname)
+            for field in obj._meta.concrete_fields if field.attname not in exclude}
+
+
+def archive_orders(order_ids):
+    """
+    在一个事务中把订单及其商品移到归档表,支付记录只保留交易编号
+    加锁后重新检查状态,只移动仍然可以归档的订单,中断时整批回滚,重新执行即可继续
+    :param order_ids: 订单编号列表
+    :return: 归档的订单数量
+    """
+    with transaction.atomic():
+        orders = list(OrderInfo.objects.select_for_update().filter(
+            order_id__in=order_ids, status__in=ARCHIVE_STATUSES).order_by('order_id'))
+        if not orders:
+            return 0
+        ids = [order.order_id for order in orders]
+        trade_ids = dict(Payment.objects.filter(order_id__in=ids).values_list('order_id', 'trade_id'))
+
+        ArchivedOrderInfo.objects.bulk_create([
+            ArchivedOrderInfo(trade_id=trade_ids.get(order.order_id), **copy_fields(order))
+            for order in orders
+        ])
+        ArchivedOrderGoods.objects.bulk_create([
+            ArchivedOrderGoods(**copy_fields(goods, exclude=('id',)))
+            for goods in OrderGoods.objects.filter(order_id__in=ids).order_by('id')
+        ])
+
+        # 订单商品与支付记录随订单一起删除
+        OrderInfo.objects.filter(order_id__in=ids).delete()
+    return len(ids)
+
+
+def get_order(order_id, user=None):
+    """
+    根据订单编号查询订单,不在订单表中时查询归档表
+    :param user: 只查询这个用户的订单
+    :return: OrderInfo或ArchivedOrderInfo对象,不存在时返回None
+    """
+    for model in (OrderInfo, ArchivedOrderInfo):
+        queryset = model.objects.filter(order_id=order_id)
+        if user is not None:
+            queryset = queryset.filter(user=user)
+        order = queryset.first()
+        if order is not None:
+            return order
+    return None
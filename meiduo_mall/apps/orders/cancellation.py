@@ -0,0 +1,90 @@
+import datetime
+import time
+from django.db import transaction
+from django_redis import get_redis_connection
+from utils.redis_script import get_script
+from .inventory import get_inventory
+from .models import OrderInfo, OrderGoods
+from . import constants, scripts
+
+# zset, {order_id: 支付期限的时间戳}
+ORDER_DEADLINES_KEY = 'order_deadlines'
+
+
+def schedule_cancel(order_id, deadline=None):
+    """
+    把未支付的订单加入延时队列,超过支付期限后自动取消
+    在下单的事务中调用,事务回滚时留下的订单编号在取消时找不到订单,直接忽略
+    """
+    if deadline is None:
+        deadline = time.time() + constants.ORDER_UNPAID_EXPIRES
+    get_redis_connection('orders').zadd(ORDER_DEADLINES_KEY, deadline, order_id)
+
+
+def get_payment_deadline(order):
+    """
+    订单的支付期限,不晚于延时队列中的取消时间
+    :return: 带时区的datetime
+    """
+    return order.create_time + datetime.timedelta(seconds=constants.ORDER_UNPAID_EXPIRES)
+
+
+def unschedule_cancel(*order_ids):
+    """
+    订单已经支付,从延时队列中删除
+    """
+    get_redis_connection('orders').zrem(ORDER_DEADLINES_KEY, *order_ids)
+
+
+def pop_due_orders(redis_cli, limit):
+    """
+    取出到期的订单,处理完成前推迟到ORDER_CANCEL_LEASE之后,进程中断时重新处理
+    :return: 订单编号列表
+    """
+    now = time.time()
+    order_ids = get_script(redis_cli, scripts.ORDER_DEADLINE_POP)(
+        keys=[ORDER_DEADLINES_KEY], args=[now, limit, now + constants.ORDER_CANCEL_LEASE], client=redis_cli)
+    return [order_id.decode() for order_id in order_ids]
+
+
+def cancel_orders(order_ids):
+    """
+    取消仍未支付的订单并归还库存,已经支付或取消的订单不处理
+    订单行加锁后再修改状态,与支付成功时的条件更新互斥,同一订单只会支付或取消其中之一
+    :return: 取消的订单编号列表
+    """
+    unpaid = OrderInfo.ORDER_STATUS_ENUM['UNPAID']
+    inventory = get_inventory()
+    with transaction.atomic():
+        canceled = list(OrderInfo.objects.select_for_update().filter(
+            order_id__in=sorted(order_ids), status=unpaid).order_by('order_id').values_list('order_id', flat=True))
+        if not canceled:
+            return []
+        OrderInfo.objects.filter(order_id__in=canceled, status=unpaid).update(
+            status=OrderInfo.ORDER_STATUS_ENUM['CANCELED'])
+
+        # 合并所有订单中相同商品的数量,一次归还
+        sku_counts = {}
+        for sku_id, count in OrderGoods.objects.filter(order_id__in=canceled).values_list('sku_id', 'count'):
+            sku_counts[sku_id] = sku_counts.get(sku_id, 0) + count
+        inventory.restock(sku_counts)
+    return canceled
+
+
+def cancel_expired_orders():
+    """
+    分批取消超过支付期限的订单
+    :return: 取消的订单数量
+    """
+    redis_cli = get_redis_connection('orders')
+    total = 0
+    for _ in range(constants.ORDER_CANCEL_MAX_BATCHES):
+        order_ids = pop_due_orders(redis_cli, constants.ORDER_CANCEL_BATCH)
+        if not order_ids:
+            break
+        total += len(cancel_orders(order_ids))
+        # 已取消、已支付或者不存在的订单都不需要再处理
+        redis_cli.zrem(ORDER_DEADLINES_KEY, *order_ids)
+        if len(order_ids) < constants.ORDER_CANCEL_BATCH:
+            break
+    return total
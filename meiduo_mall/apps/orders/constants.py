@@ -0,0 +1,59 @@
+# 扣减库存发生锁冲突(锁等待超时、死锁)时,整个下单事务最多执行的次数
+ORDER_CONFLICT_RETRIES = 3
+
+# 重试前等待的基础秒数,每次重试加倍
+ORDER_CONFLICT_BACKOFF = 0.05
+
+# redis库存计数器加载失败(正在同步)时的重试次数与等待的基础秒数
+INVENTORY_LOAD_RETRIES = 3
+INVENTORY_LOAD_BACKOFF = 0.05
+
+# 同步redis库存时每批处理的商品数量
+INVENTORY_SYNC_BATCH = 500
+
+# 同步redis库存的锁的有效期,进程中断时自动释放,同步期间每批续期
+INVENTORY_SYNC_LOCK_EXPIRES = 60 * 5
+
+# 已经同步到mysql的redis批次的记录保留的天数
+SYNC_BATCH_KEEP_DAYS = 7
+
+# 订单编号进程编号的租约有效期(秒),进程生成编号时续期,退出后过期才能分配给其它进程
+ORDER_ID_WORKER_LEASE = 60
+
+# 异步下单凭证的有效期
+ORDER_TICKET_EXPIRES = 60 * 60
+
+# 异步下单占用的商品名额的有效期,任务中断时自动释放
+ORDER_SLOT_EXPIRES = 60
+
+# 没有空闲名额时任务重新排队的等待秒数与最多次数
+ORDER_SLOT_RETRY_COUNTDOWN = 0.5
+ORDER_SLOT_RETRIES = 120
+
+# 运费
+ORDER_FREIGHT = 10
+
+# 结算页面报价的有效期
+ORDER_QUOTE_EXPIRES = 60 * 10
+
+# 未支付订单的支付期限,过期后自动取消并归还库存
+ORDER_UNPAID_EXPIRES = 60 * 30
+
+# 每批取消的订单数量,每次任务最多处理的批数
+ORDER_CANCEL_BATCH = 200
+ORDER_CANCEL_MAX_BATCHES = 50
+
+# 取出到期订单后的处理期限,进程中断时在期限之后重新处理
+ORDER_CANCEL_LEASE = 60
+
+# 同步缓冲的销量时每条更新语句处理的数量
+SALES_SYNC_BATCH = 500
+
+# 同步销量的锁的有效期,进程中断时自动释放
+SALES_SYNC_LOCK_EXPIRES = 60 * 5
+
+# 已完成、已取消的订单在创建多少天后归档
+ORDER_ARCHIVE_DAYS = 180
+
+# 归档时每个事务移动的订单数量
+ORDER_ARCHIVE_BATCH = 500
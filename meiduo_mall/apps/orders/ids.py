@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+import uuid
+from django.conf import settings
+from django.utils.module_loading import import_string
+from django_redis import get_redis_connection
+from utils.redis_lock import RedisLock
+from utils.redis_script import get_script
+from . import constants, scripts
+
+# 进程编号的租约, order_id_worker:<编号>, 值为持有者标识
+ORDER_ID_WORKER_KEY = 'order_id_worker:'
+# 下一次分配从这个编号之后开始尝试
+ORDER_ID_WORKER_NEXT_KEY = 'order_id_worker_next'
+
+
+class OrderIdWorkersExhausted(Exception):
+    """
+    所有进程编号都被其它进程租用
+    """
+    pass
+
+
+class TimeSequenceOrderIdGenerator(object):
+    """
+    订单编号: 时间(年月日时分秒14位) + 进程编号(3位) + 每秒内的序号(6位), 共23位数字
+    按时间排序,在进程内生成,不需要查询数据库
+    进程编号在第一次生成时从redis中租用,fork出的子进程重新租用
+    租约的有效期为ORDER_ID_WORKER_LEASE,生成编号时超过三分之一有效期就续期,
+    续期失败说明租约已经过期、编号可能被其它进程租用,重新租用一个编号后再生成
+    """
+    WORKER_DIGITS = 3
+    SEQUENCE_DIGITS = 6
+
+    def __init__(self):
+        self.worker_limit = 10 ** self.WORKER_DIGITS
+        self.sequence_limit = 10 ** self.SEQUENCE_DIGITS
+        self.lock = threading.Lock()
+        self.pid = None
+        self.worker_id = None
+        # 进程编号的租约与上次续期的时间
+        self.lease = None
+        self.lease_time = 0
+        self.last_second = 0
+        self.sequence = 0
+
+    def allocate_worker_id(self):
+        """
+        租用一个空闲的进程编号
+        :return: 进程编号
+        """
+        redis_cli = get_redis_connection('orders')
+        token = uuid.uuid4().hex
+        # 在发送命令前记录时间,redis中的租约不会比本地记录的更早过期
+        lease_time = time.monotonic()
+        worker_id = get_script(redis_cli, scripts.ORDER_ID_WORKER_ALLOCATE)(
+            keys=[ORDER_ID_WORKER_KEY, ORDER_ID_WORKER_NEXT_KEY],
+            args=[self.worker_limit, token, constants.ORDER_ID_WORKER_LEASE], client=redis_cli)
+        if worker_id < 0:
+            raise OrderIdWorkersExhausted('%d个订单编号进程编号都已经被租用' % self.worker_limit)
+        self.lease = RedisLock(redis_cli, ORDER_ID_WORKER_KEY + str(worker_id),
+                               constants.ORDER_ID_WORKER_LEASE, token=token)
+        self.lease_time = lease_time
+        return worker_id
+
+    def keep_worker_id(self):
+        """
+        需要时续期租约,租约已经失去时重新租用
+        """
+        now = time.monotonic()
+        if now - self.lease_time < constants.ORDER_ID_WORKER_LEASE / 3:
+            return
+        if self.lease.refresh():
+            self.lease_time = now
+        else:
+            self.worker_id = self.allocate_worker_id()
+
+    def __call__(self, user=None):
+        with self.lock:
+            pid = os.getpid()
+            if pid != self.pid:
+                # 新进程或者fork出的子进程,重新分配编号并清空序号
+                self.worker_id = self.allocate_worker_id()
+                self.pid = pid
+                self.last_second = 0
+                self.sequence = 0
+            else:
+                self.keep_worker_id()
+
+            now = int(time.time())
+            # 时钟回拨时继续使用上一秒
+            if now <= self.last_second:
+                now = self.last_second
+                self.sequence += 1
+                if self.sequence >= self.sequence_limit:
+                    # 一秒内的序号用完,等待下一秒
+                    while int(time.time()) <= self.last_second:
+                        time.sleep(0.001)
+                    now = int(time.time())
+                    self.sequence = 0
+            else:
+                self.sequence = 0
+            self.last_second = now
+
+            return '%s%0*d%0*d' % (
+                time.strftime('%Y%m%d%H%M%S', time.localtime(now)),
+                self.WORKER_DIGITS, self.worker_id,
+                self.SEQUENCE_DIGITS, self.sequence,
+            )
+
+
+_generator = None
+
+
+def generate_order_id(user=None):
+    """
+    使用ORDER_ID_GENERATOR生成订单编号
+    :param user: 下单用户,自定义的生成器可以使用
+    :return: 订单编号字符串
+    """
+    global _generator
+    if _generator is None:
+        _generator = import_string(settings.ORDER_ID_GENERATOR)()
+    return _generator(user)
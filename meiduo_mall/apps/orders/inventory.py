@@ -0,0 +1,267 @@
+import logging
+import time
+import uuid
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, When, F, IntegerField
+from django_redis import get_redis_connection
+from utils.redis_script import get_script
+from goods.models import Goods, SKU
+from . import constants, scripts
+from .sales import add_sales, record_sales
+from .utils import reserve_stock, claim_sync_batch, InsufficientStock
+from utils.redis_lock import RedisLock
+
+logger = logging.getLogger('django')
+
+STOCK_KEY = 'stock%d'
+STOCK_PENDING_KEY = 'stock_pending'
+STOCK_FLUSHING_KEY = 'stock_flushing'
+STOCK_FLUSHING_BATCH_KEY = 'stock_flushing_batch'
+STOCK_SEQ_KEY = 'stock_seq'
+STOCK_SYNC_LOCK_KEY = 'stock_sync_lock'
+
+
+class InventoryBusy(Exception):
+    """
+    库存正在同步,暂时不能加载计数器
+    """
+    pass
+
+
+def restore_stock(sku_counts):
+    """
+    归还商品的库存,减少商品与SPU的销量,需要在事务中调用
+    所有商品在一条更新语句中完成,按商品编号顺序更新,不会与下单的事务死锁
+    :param sku_counts: {sku_id: count}
+    """
+    sku_ids = sorted(sku_counts)
+    if not sku_ids:
+        return
+    buffered = settings.ORDER_SALES_BUFFERED
+    fields = {
+        'stock': Case(*[When(id=sku_id, then=F('stock') + sku_counts[sku_id]) for sku_id in sku_ids],
+                      output_field=IntegerField()),
+    }
+    if not buffered:
+        fields['sales'] = Case(*[When(id=sku_id, then=F('sales') - sku_counts[sku_id]) for sku_id in sku_ids],
+                               output_field=IntegerField())
+    SKU.objects.filter(id__in=sku_ids).update(**fields)
+
+    goods_sales = {}
+    for sku_id, goods_id in SKU.objects.filter(id__in=sku_ids).values_list('id', 'goods_id'):
+        goods_sales[goods_id] = goods_sales.get(goods_id, 0) - sku_counts[sku_id]
+    record_sales({sku_id: -count for sku_id, count in sku_counts.items()} if buffered else None, goods_sales)
+
+
+class DatabaseInventory(object):
+    """
+    直接在mysql中扣减库存,需要在下单的事务中调用
+    """
+    def reserve(self, cart_dict):
+        """
+        扣减库存,增加销量
+        :param cart_dict: {sku_id: count}
+        :return: {sku_id: sku}
+        """
+        # 不缓冲销量时,商品的销量与库存在同一条语句中更新
+        buffered = settings.ORDER_SALES_BUFFERED
+        skus = reserve_stock(cart_dict, update_sales=not buffered)
+        goods_sales = {}
+        for sku_id, count in cart_dict.items():
+            goods_id = skus[sku_id].goods_id
+            goods_sales[goods_id] = goods_sales.get(goods_id, 0) + count
+        record_sales(cart_dict if buffered else None, goods_sales)
+        return skus
+
+    def release(self):
+        # 数据库事务回滚时库存一起回滚
+        pass
+
+    def restock(self, sku_counts):
+        """
+        归还已经保存的订单扣减的库存,例如取消订单,在取消订单的事务中调用
+        :param sku_counts: {sku_id: count}
+        """
+        restore_stock(sku_counts)
+
+
+class RedisInventory(object):
+    """
+    在redis中预先扣减库存,下单时不修改tb_sku,热门商品不会在同一行上排队
+    扣减的数量记录在stock_pending中,由sync_inventory定期批量同步到mysql
+    """
+    def __init__(self, redis_cli=None):
+        self.redis_cli = redis_cli or get_redis_connection('orders')
+        self.reserved = None
+
+    def _call(self, source, keys, args, client=None):
+        return get_script(self.redis_cli, source)(keys=keys, args=args, client=client or self.redis_cli)
+
+    def reserve(self, cart_dict):
+        """
+        在redis中一次扣减所有商品的库存,全部足够时才扣减
+        计数器不存在时从mysql加载后重试
+        :param cart_dict: {sku_id: count}
+        :return: {sku_id: sku}
+        """
+        sku_ids = sorted(cart_dict)
+        keys = [STOCK_PENDING_KEY] + [STOCK_KEY % sku_id for sku_id in sku_ids]
+        args = []
+        for sku_id in sku_ids:
+            args.extend([sku_id, cart_dict[sku_id]])
+
+        for _ in range(constants.INVENTORY_LOAD_RETRIES):
+            result = self._call(scripts.INVENTORY_DEDUCT, keys, args)
+            if result[0] == 1:
+                break
+            if result[0] == 0:
+                raise InsufficientStock({int(sku_id): int(stock) for sku_id, stock in zip(result[1::2], result[2::2])})
+            self.load([int(sku_id) for sku_id in result[1:]])
+        else:
+            raise InventoryBusy()
+        self.reserved = cart_dict
+
+        # 只读取下单需要的商品信息,不加锁
+        skus = {sku.id: sku for sku in SKU.objects.filter(id__in=sku_ids)}
+        shortages = {sku_id: 0 for sku_id in sku_ids if sku_id not in skus or not skus[sku_id].is_launched}
+        if shortages:
+            raise InsufficientStock(shortages)
+        return skus
+
+    def release(self):
+        """
+        订单没有保存成功时归还已经扣减的库存
+        """
+        if not self.reserved:
+            return
+        self._release(self.reserved)
+        self.reserved = None
+
+    def restock(self, sku_counts):
+        """
+        归还已经保存的订单扣减的库存,在取消订单的事务提交后执行
+        stock_pending中的数量减少,已经同步到mysql的部分在下次同步时加回mysql
+        :param sku_counts: {sku_id: count}
+        """
+        transaction.on_commit(lambda: self._release(sku_counts))
+
+    def _release(self, sku_counts):
+        sku_ids = sorted(sku_counts)
+        args = []
+        for sku_id in sku_ids:
+            args.extend([sku_id, sku_counts[sku_id]])
+        self._call(scripts.INVENTORY_RELEASE, [STOCK_PENDING_KEY] + [STOCK_KEY % sku_id for sku_id in sku_ids], args)
+
+    def load(self, sku_ids, force=False):
+        """
+        根据mysql中的库存设置计数器
+        :param sku_ids: 商品编号列表
+        :param force: 是否覆盖已经存在的计数器
+        :return: {sku_id: (原计数器, 新计数器)}
+        """
+        for attempt in range(constants.INVENTORY_LOAD_RETRIES):
+            seq = self.redis_cli.get(STOCK_SEQ_KEY) or b'0'
+            if int(seq) % 2 == 0:
+                stocks = dict(SKU.objects.filter(id__in=sku_ids).values_list('id', 'stock'))
+                keys = [STOCK_PENDING_KEY, STOCK_FLUSHING_KEY, STOCK_SEQ_KEY]
+                args = [seq, int(force)]
+                for sku_id in sku_ids:
+                    # 已经删除的商品没有库存
+                    keys.append(STOCK_KEY % sku_id)
+                    args.extend([sku_id, stocks.get(sku_id, 0)])
+                result = self._call(scripts.INVENTORY_LOAD, keys, args)
+                if result[0] == 1:
+                    return {int(sku_id): (int(old) if old else None, int(new))
+                            for sku_id, old, new in zip(result[1::3], result[2::3], result[3::3])}
+            # 正在同步,稍后重试
+            time.sleep(constants.INVENTORY_LOAD_BACKOFF * (attempt + 1))
+        raise InventoryBusy()
+
+
+def get_inventory():
+    """
+    根据ORDER_INVENTORY_MODE获取扣减库存的方式,每个订单使用一个新的对象
+    """
+    if settings.ORDER_INVENTORY_MODE == 'redis':
+        return RedisInventory()
+    return DatabaseInventory()
+
+
+def flush_inventory(redis_cli):
+    """
+    把redis中已经扣减的数量批量同步到mysql,同时累加商品与SPU的销量
+    每次同步有一个批次编号,与修改一起在mysql的事务中记录,mysql提交后才删除stock_flushing
+    中断时下次重新同步同一个批次,已经提交过的批次只清理redis,不会重复扣减
+    :return: 同步的商品数量
+    """
+    result = get_script(redis_cli, scripts.INVENTORY_FLUSH_BEGIN)(
+        keys=[STOCK_PENDING_KEY, STOCK_FLUSHING_KEY, STOCK_SEQ_KEY, STOCK_FLUSHING_BATCH_KEY],
+        args=[uuid.uuid4().hex], client=redis_cli)
+    if not result:
+        return 0
+    batch_id, items = result[0].decode(), result[1]
+    flushing = {int(sku_id): int(count) for sku_id, count in zip(items[::2], items[1::2]) if int(count)}
+
+    sku_ids = sorted(flushing)
+    with transaction.atomic():
+        if not claim_sync_batch('inventory', batch_id):
+            logger.warning('库存批次%s已经同步过,跳过' % batch_id)
+            sku_ids = []
+        for i in range(0, len(sku_ids), constants.INVENTORY_SYNC_BATCH):
+            batch = sku_ids[i:i + constants.INVENTORY_SYNC_BATCH]
+            SKU.objects.filter(id__in=batch).update(
+                stock=Case(*[When(id=sku_id, then=F('stock') - flushing[sku_id]) for sku_id in batch],
+                           output_field=IntegerField()),
+                sales=Case(*[When(id=sku_id, then=F('sales') + flushing[sku_id]) for sku_id in batch],
+                           output_field=IntegerField()),
+            )
+        goods_sales = {}
+        for sku_id, goods_id in SKU.objects.filter(id__in=sku_ids).values_list('id', 'goods_id'):
+            goods_sales[goods_id] = goods_sales.get(goods_id, 0) + flushing[sku_id]
+        add_sales(Goods, goods_sales)
+
+    get_script(redis_cli, scripts.INVENTORY_FLUSH_END)(
+        keys=[STOCK_FLUSHING_KEY, STOCK_SEQ_KEY, STOCK_FLUSHING_BATCH_KEY], client=redis_cli)
+    return len(sku_ids)
+
+
+def reconcile_inventory(redis_cli, lock=None):
+    """
+    比较计数器与mysql中的库存,修正不一致的计数器,例如后台修改了库存
+    :param lock: 同步的锁,每批续期,锁已经失去时停止
+    :return: {sku_id: (原计数器, 新计数器)}
+    """
+    inventory = RedisInventory(redis_cli)
+    drift = {}
+    sku_ids = []
+    for key in redis_cli.scan_iter(match='stock[0-9]*', count=constants.INVENTORY_SYNC_BATCH):
+        sku_ids.append(int(key[len('stock'):]))
+        if len(sku_ids) >= constants.INVENTORY_SYNC_BATCH:
+            if lock is not None and not lock.refresh():
+                return drift
+            drift.update(inventory.load(sku_ids, force=True))
+            sku_ids = []
+    if sku_ids:
+        drift.update(inventory.load(sku_ids, force=True))
+    return drift
+
+
+def sync_inventory():
+    """
+    同步并核对库存,同一时间只有一个进程执行
+    :return: (同步的商品数量, 修正的计数器) 或 None
+    """
+    redis_cli = get_redis_connection('orders')
+    lock = RedisLock(redis_cli, STOCK_SYNC_LOCK_KEY, constants.INVENTORY_SYNC_LOCK_EXPIRES)
+    if not lock.acquire():
+        return None
+    try:
+        flushed = flush_inventory(redis_cli)
+        drift = reconcile_inventory(redis_cli, lock)
+    finally:
+        lock.release()
+
+    for sku_id, (old, new) in drift.items():
+        logger.warning('库存计数器与mysql不一致, sku_id=%d: %s -> %d' % (sku_id, old, new))
+    return flushed, drift
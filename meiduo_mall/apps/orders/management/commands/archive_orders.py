@@ -0,0 +1,42 @@
+import datetime
+import time
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from orders.archive import archivable_orders, archive_orders
+from orders import constants
+
+
+class Command(BaseCommand):
+    """
+    把创建时间超过归档期限的已完成、已取消订单移到归档表
+    按订单编号顺序分批处理,每批一个事务,中断后重新执行会继续处理剩余的订单
+    """
+    help = '归档已完成、已取消的历史订单'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=constants.ORDER_ARCHIVE_DAYS, help='归档创建多少天之前的订单')
+        parser.add_argument('--batch', type=int, default=constants.ORDER_ARCHIVE_BATCH, help='每批归档的订单数量')
+        parser.add_argument('--sleep', type=float, default=0, help='每批之间暂停的秒数')
+        parser.add_argument('--after', default='', help='从这个订单编号之后开始,用于跳过已经处理过的部分')
+        parser.add_argument('--dry-run', action='store_true', help='只统计,不修改数据')
+
+    def handle(self, *args, **options):
+        before = timezone.now() - datetime.timedelta(days=options['days'])
+        queryset = archivable_orders(before)
+        if options['dry_run']:
+            self.stdout.write('可以归档%d个订单' % queryset.filter(order_id__gt=options['after']).count())
+            return
+
+        last = options['after']
+        total = 0
+        while True:
+            order_ids = list(queryset.filter(order_id__gt=last).order_by('order_id')
+                             .values_list('order_id', flat=True)[:options['batch']])
+            if not order_ids:
+                break
+            total += archive_orders(order_ids)
+            last = order_ids[-1]
+            self.stdout.write('已归档%d个订单, 最后的订单编号: %s' % (total, last))
+            time.sleep(options['sleep'])
+
+        self.stdout.write('共归档%d个订单' % total)
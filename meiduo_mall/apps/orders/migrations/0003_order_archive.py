@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 19:31
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_auto_20180824_2224'),
+        ('goods', '0002_auto_20180827_1507'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('orders', '0002_order_user_time_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrderGoods',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=1, verbose_name='数量')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='单价')),
+                ('comment', models.TextField(default='', verbose_name='评价信息')),
+                ('score', models.SmallIntegerField(choices=[(0, '0分'), (1, '20分'), (2, '40分'), (3, '60分'), (4, '80分'), (5, '100分')], default=5, verbose_name='满意度评分')),
+                ('is_anonymous', models.BooleanField(default=False, verbose_name='是否匿名评价')),
+                ('is_commented', models.BooleanField(default=False, verbose_name='是否评价了')),
+                ('create_time', models.DateTimeField(verbose_name='创建时间')),
+                ('update_time', models.DateTimeField(verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '归档订单商品',
+                'verbose_name_plural': '归档订单商品',
+                'db_table': 'tb_order_goods_archive',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderInfo',
+            fields=[
+                ('order_id', models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name='订单号')),
+                ('total_count', models.IntegerField(default=1, verbose_name='商品总数')),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='商品总金额')),
+                ('freight', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='运费')),
+                ('pay_method', models.SmallIntegerField(choices=[(1, '货到付款'), (2, '支付宝'), (3, '微信'), (4, '银联卡')], default=1, verbose_name='支付方式')),
+                ('status', models.SmallIntegerField(choices=[(1, '待支付'), (2, '待发货'), (3, '待收货'), (4, '待评价'), (5, '已完成'), (6, '已取消')], default=1, verbose_name='订单状态')),
+                ('trade_id', models.CharField(blank=True, max_length=100, null=True, verbose_name='支付编号')),
+                ('create_time', models.DateTimeField(verbose_name='创建时间')),
+                ('update_time', models.DateTimeField(verbose_name='更新时间')),
+                ('archive_time', models.DateTimeField(auto_now_add=True, verbose_name='归档时间')),
+                ('address', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='users.Address', verbose_name='收获地址')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_orders', to=settings.AUTH_USER_MODEL, verbose_name='下单用户')),
+            ],
+            options={
+                'verbose_name': '归档订单',
+                'verbose_name_plural': '归档订单',
+                'db_table': 'tb_order_info_archive',
+            },
+        ),
+        migrations.AddField(
+            model_name='archivedordergoods',
+            name='order',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='skus', to='orders.ArchivedOrderInfo', verbose_name='订单'),
+        ),
+        migrations.AddField(
+            model_name='archivedordergoods',
+            name='sku',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='goods.SKU', verbose_name='订单商品'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedorderinfo',
+            index=models.Index(fields=['user', 'create_time', 'order_id'], name='order_archive_user_time_idx'),
+        ),
+    ]
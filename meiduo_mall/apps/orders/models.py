@@ -25,7 +25,8 @@ class OrderInfo(BaseModel):
         "UNSEND": 2,
         "UNRECEIVED": 3,
         "UNCOMMENT": 4,
-        "FINISHED": 5
+        "FINISHED": 5,
+        "CANCELED": 6,
     }
 
     ORDER_STATUS_CHOICES = (
@@ -50,6 +51,10 @@ class OrderInfo(BaseModel):
         db_table = "tb_order_info"
         verbose_name = '订单基本信息'
         verbose_name_plural = verbose_name
+        # 用户订单列表按照(create_time, order_id)分页
+        indexes = [
+            models.Index(fields=['user', 'create_time', 'order_id'], name='order_user_time_idx'),
+        ]
 
 
 class OrderGoods(BaseModel):
@@ -77,3 +82,66 @@ class OrderGoods(BaseModel):
         db_table = "tb_order_goods"
         verbose_name = '订单商品'
         verbose_name_plural = verbose_name
+
+
+class ArchivedOrderInfo(models.Model):
+    """
+    归档的订单信息,已完成或已取消并且超过归档期限的订单从tb_order_info移到这里
+    """
+    order_id = models.CharField(max_length=64, primary_key=True, verbose_name="订单号")
+    user = models.ForeignKey(User, related_name='archived_orders', on_delete=models.PROTECT, verbose_name="下单用户")
+    address = models.ForeignKey(Address, related_name='+', on_delete=models.PROTECT, verbose_name="收获地址")
+    total_count = models.IntegerField(default=1, verbose_name="商品总数")
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="商品总金额")
+    freight = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="运费")
+    pay_method = models.SmallIntegerField(choices=OrderInfo.PAY_METHOD_CHOICES, default=1, verbose_name="支付方式")
+    status = models.SmallIntegerField(choices=OrderInfo.ORDER_STATUS_CHOICES, default=1, verbose_name="订单状态")
+    # 支付记录不归档,只保留支付宝交易编号
+    trade_id = models.CharField(max_length=100, null=True, blank=True, verbose_name="支付编号")
+    # 保留原订单的时间
+    create_time = models.DateTimeField(verbose_name="创建时间")
+    update_time = models.DateTimeField(verbose_name="更新时间")
+    archive_time = models.DateTimeField(auto_now_add=True, verbose_name="归档时间")
+
+    class Meta:
+        db_table = "tb_order_info_archive"
+        verbose_name = '归档订单'
+        verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=['user', 'create_time', 'order_id'], name='order_archive_user_time_idx'),
+        ]
+
+
+class ArchivedOrderGoods(models.Model):
+    """
+    归档的订单商品
+    """
+    order = models.ForeignKey(ArchivedOrderInfo, related_name='skus', on_delete=models.CASCADE, verbose_name="订单")
+    sku = models.ForeignKey(SKU, related_name='+', on_delete=models.PROTECT, verbose_name="订单商品")
+    count = models.IntegerField(default=1, verbose_name="数量")
+    price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="单价")
+    comment = models.TextField(default="", verbose_name="评价信息")
+    score = models.SmallIntegerField(choices=OrderGoods.SCORE_CHOICES, default=5, verbose_name='满意度评分')
+    is_anonymous = models.BooleanField(default=False, verbose_name='是否匿名评价')
+    is_commented = models.BooleanField(default=False, verbose_name='是否评价了')
+    create_time = models.DateTimeField(verbose_name="创建时间")
+    update_time = models.DateTimeField(verbose_name="更新时间")
+
+    class Meta:
+        db_table = "tb_order_goods_archive"
+        verbose_name = '归档订单商品'
+        verbose_name_plural = verbose_name
+
+
+class SyncBatch(BaseModel):
+    """
+    已经同步到mysql的redis批次,与同步的修改在同一个事务中保存
+    同步提交后redis没有完成清理时,下次重新同步同一个批次会被跳过,不会重复扣减库存或累加销量
+    """
+    name = models.CharField(max_length=20, verbose_name="同步类型")
+    batch_id = models.CharField(max_length=32, unique=True, verbose_name="批次编号")
+
+    class Meta:
+        db_table = "tb_sync_batch"
+        verbose_name = '同步批次'
+        verbose_name_plural = verbose_name
@@ -0,0 +1,171 @@
+import time
+import uuid
+from django.db import transaction, OperationalError
+from django_redis import get_redis_connection
+from utils.redis_script import get_script
+from carts.storage import RedisCart
+from goods.utils import get_sku_cards
+from .cancellation import schedule_cancel
+from .ids import generate_order_id
+from .inventory import get_inventory, InventoryBusy
+from .models import OrderGoods, OrderInfo
+from .utils import retry_on_conflict, is_lock_conflict, InsufficientStock
+from . import constants, scripts
+
+ORDER_TICKET_KEY = 'order_ticket_%s'
+ORDER_SLOTS_KEY = 'order_slots%d'
+
+
+def place_order(user, address, pay_method, cart_dict, prices=None, freight=constants.ORDER_FREIGHT):
+    """
+    扣减库存并保存订单,锁冲突时重新执行整个事务,成功后删除购物车中的商品
+    :param cart_dict: {sku_id: count}
+    :param prices: 结算报价中的单价 {sku_id: price}, 为None时使用商品的当前价格
+    :param freight: 运费
+    :return: 订单对象
+    """
+    order = retry_on_conflict(save_order, user, address, pay_method, cart_dict, prices, freight)
+    RedisCart(user.id).delete(*cart_dict.keys())
+    return order
+
+
+def save_order(user, address, pay_method, cart_dict, prices, freight):
+    """
+    在一个事务中扣减库存并保存订单,出现异常时全部回滚
+    """
+    # 根据ORDER_INVENTORY_MODE在mysql或redis中扣减库存
+    inventory = get_inventory()
+    try:
+        with transaction.atomic():
+            order = create_order(user, address, pay_method, cart_dict, prices, freight, inventory)
+    except Exception:
+        # 在redis中扣减的库存不会随事务回滚,需要归还
+        inventory.release()
+        raise
+    return order
+
+
+def create_order(user, address, pay_method, cart_dict, prices, freight, inventory):
+    """
+    扣减库存并保存订单,在save_order的事务中执行
+    """
+    # 1.一次扣减所有商品的库存,库存不足时抛出异常
+    skus = inventory.reserve(cart_dict)
+
+    # 2.计算总金额,总数量,报价中的单价与商品的当前价格一致时才使用
+    prices = quoted_prices(prices, skus)
+    total_count = 0
+    total_amount = 0
+    for sku_id, count in cart_dict.items():
+        total_count += count
+        total_amount += count * prices[sku_id]
+
+    # 3.创建OrderInfo对象,总金额与总数量一起写入
+    order = OrderInfo.objects.create(
+        order_id=generate_order_id(user),
+        user=user,
+        address=address,
+        total_count=total_count,
+        total_amount=total_amount,
+        freight=freight,
+        pay_method=pay_method,
+        status=2 if pay_method == 1 else 1
+    )
+    if order.status == OrderInfo.ORDER_STATUS_ENUM['UNPAID']:
+        # 超过支付期限后自动取消
+        schedule_cancel(order.order_id)
+
+    # 4.一次插入所有的OrderGoods
+    OrderGoods.objects.bulk_create([
+        OrderGoods(order=order, sku=skus[sku_id], count=count, price=prices[sku_id])
+        for sku_id, count in cart_dict.items()
+    ])
+
+    return order
+
+
+def quoted_prices(prices, skus):
+    """
+    以锁定的商品行为准检查报价中的单价,任何一个商品的价格已经修改时全部使用当前价格
+    后台或批量更新修改价格后,旧的报价不会按照旧价格下单
+    :param prices: 报价中的单价 {sku_id: price}, 没有报价时为None
+    :param skus: 扣减库存时读取的商品 {sku_id: sku}
+    :return: 下单使用的单价 {sku_id: price}
+    """
+    current = {sku_id: sku.price for sku_id, sku in skus.items()}
+    if prices is None or any(prices.get(sku_id) != price for sku_id, price in current.items()):
+        return current
+    return prices
+
+
+def placement_error(exc):
+    """
+    下单失败时返回给用户的错误信息字符串,不是下单业务的异常时返回None
+    """
+    if isinstance(exc, InsufficientStock):
+        # 一条消息中列出每个库存不足的商品
+        cards = get_sku_cards(exc.shortages.keys())
+        return '库存不足: ' + ';'.join(
+            '%s剩余%d件' % (cards[sku_id]['name'] if sku_id in cards else sku_id, stock)
+            for sku_id, stock in sorted(exc.shortages.items()))
+    if isinstance(exc, InventoryBusy) or (isinstance(exc, OperationalError) and is_lock_conflict(exc)):
+        return '下单人数过多,请稍后重试'
+    return None
+
+
+def create_ticket(user_id):
+    """
+    异步下单时创建下单凭证,保存在redis中供前端查询进度
+    :return: 凭证编号
+    """
+    ticket = uuid.uuid4().hex
+    key = ORDER_TICKET_KEY % ticket
+    pl = get_redis_connection('orders').pipeline()
+    pl.hmset(key, {'status': 'queued', 'user_id': user_id})
+    pl.expire(key, constants.ORDER_TICKET_EXPIRES)
+    pl.execute()
+    return ticket
+
+
+def get_ticket(ticket):
+    """
+    :return: {'status': 'queued'/'processing'/'created'/'failed', 'user_id':, 'order_id':, 'reason':}, 不存在时返回None
+    """
+    data = get_redis_connection('orders').hgetall(ORDER_TICKET_KEY % ticket)
+    if not data:
+        return None
+    return {key.decode(): value.decode() for key, value in data.items()}
+
+
+def update_ticket(ticket, **fields):
+    get_redis_connection('orders').hmset(ORDER_TICKET_KEY % ticket, fields)
+
+
+def claim_ticket(ticket, claim):
+    """
+    同一个凭证只能由一个任务处理,任务重试时使用相同的claim
+    """
+    redis_cli = get_redis_connection('orders')
+    key = ORDER_TICKET_KEY % ticket
+    return redis_cli.hsetnx(key, 'claim', claim) or redis_cli.hget(key, 'claim') == claim.encode()
+
+
+def acquire_sku_slots(sku_ids, limit, token):
+    """
+    占用每个商品的下单名额,所有商品都有空闲名额时才占用,限制同一商品同时下单的任务数量
+    名额在ORDER_SLOT_EXPIRES后自动失效,任务中断时不会一直占用
+    :return: 是否占用成功
+    """
+    redis_cli = get_redis_connection('orders')
+    script = get_script(redis_cli, scripts.SKU_SLOTS_ACQUIRE)
+    return bool(script(keys=[ORDER_SLOTS_KEY % sku_id for sku_id in sorted(sku_ids)],
+                       args=[int(time.time() * 1000), constants.ORDER_SLOT_EXPIRES * 1000, limit, token],
+                       client=redis_cli))
+
+
+def release_sku_slots(sku_ids, token):
+    redis_cli = get_redis_connection('orders')
+    pl = redis_cli.pipeline(transaction=False)
+    for sku_id in sku_ids:
+        pl.zrem(ORDER_SLOTS_KEY % sku_id, token)
+    pl.execute()
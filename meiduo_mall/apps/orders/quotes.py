@@ -0,0 +1,60 @@
+import json
+import uuid
+from decimal import Decimal
+from django.conf import settings
+from django_redis import get_redis_connection
+from itsdangerous import Signer, BadData
+from . import constants
+
+ORDER_QUOTE_KEY = 'order_quote_%s'
+
+
+def signer():
+    return Signer(settings.SECRET_KEY, salt='order_quote')
+
+
+def create_quote(user_id, cart_selected, cards, freight):
+    """
+    保存结算页面显示的商品、数量、单价与运费,下单时直接使用
+    :param cart_selected: {sku_id: count}
+    :param cards: 商品卡片 {sku_id: {'price':, ...}}
+    :return: 签名后的报价编号
+    """
+    quote_id = uuid.uuid4().hex
+    quote = {
+        'user_id': user_id,
+        'freight': str(freight),
+        'items': [[sku_id, count, str(cards[sku_id]['price'])]
+                  for sku_id, count in cart_selected.items() if sku_id in cards],
+    }
+    get_redis_connection('orders').setex(ORDER_QUOTE_KEY % quote_id, constants.ORDER_QUOTE_EXPIRES, json.dumps(quote))
+    return signer().sign(quote_id.encode()).decode()
+
+
+def use_quote(signed_quote_id, user_id):
+    """
+    读取并删除报价,每个报价只能下单一次
+    签名无效、已过期或者不是当前用户的报价时返回None
+    报价中的单价在下单时与锁定的商品价格比较,见placement.quoted_prices
+    :return: ({sku_id: count}, {sku_id: price}, freight) 或 None
+    """
+    try:
+        quote_id = signer().unsign(signed_quote_id).decode()
+    except BadData:
+        return None
+
+    key = ORDER_QUOTE_KEY % quote_id
+    pl = get_redis_connection('orders').pipeline()
+    pl.get(key)
+    pl.delete(key)
+    quote = pl.execute()[0]
+    if quote is None:
+        return None
+
+    quote = json.loads(quote.decode())
+    if quote['user_id'] != user_id or not quote['items']:
+        return None
+
+    cart_dict = {sku_id: count for sku_id, count, _ in quote['items']}
+    prices = {sku_id: Decimal(price) for sku_id, _, price in quote['items']}
+    return cart_dict, prices, Decimal(quote['freight'])
@@ -0,0 +1,132 @@
+import logging
+import uuid
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, When, F, IntegerField
+from django_redis import get_redis_connection
+from utils.redis_script import get_script
+from goods.models import Goods, SKU
+from utils.redis_lock import RedisLock
+from . import constants, scripts
+from .utils import claim_sync_batch
+
+logger = logging.getLogger('django')
+
+# hash, 还没有同步到mysql的销量, {sku_id: count}, {goods_id: count}
+SKU_SALES_PENDING_KEY = 'sku_sales_pending'
+SKU_SALES_FLUSHING_KEY = 'sku_sales_flushing'
+GOODS_SALES_PENDING_KEY = 'goods_sales_pending'
+GOODS_SALES_FLUSHING_KEY = 'goods_sales_flushing'
+# 正在同步的批次编号
+SALES_FLUSHING_BATCH_KEY = 'sales_flushing_batch'
+SALES_SYNC_LOCK_KEY = 'sales_sync_lock'
+
+SALES_KEYS = {
+    SKU: (SKU_SALES_PENDING_KEY, SKU_SALES_FLUSHING_KEY),
+    Goods: (GOODS_SALES_PENDING_KEY, GOODS_SALES_FLUSHING_KEY),
+}
+
+
+def add_sales(model, sales):
+    """
+    累加商品或SPU的销量,每批在一条更新语句中完成,按编号顺序更新,不覆盖其它订单的修改
+    :param model: SKU或Goods
+    :param sales: {id: count}, count为负数时减少销量
+    """
+    ids = sorted(sales)
+    for i in range(0, len(ids), constants.SALES_SYNC_BATCH):
+        batch = ids[i:i + constants.SALES_SYNC_BATCH]
+        model.objects.filter(id__in=batch).update(
+            sales=Case(*[When(id=obj_id, then=F('sales') + sales[obj_id]) for obj_id in batch],
+                       output_field=IntegerField())
+        )
+
+
+def record_sales(sku_sales, goods_sales):
+    """
+    记录下单或取消订单引起的销量变化,需要在下单或取消订单的事务中调用
+    ORDER_SALES_BUFFERED为True时,事务提交后累加到redis,由flush_sales定期同步到mysql,订单之间不在SPU的行上排队
+    :param sku_sales: {sku_id: count}, 已经与库存一起更新时传入None
+    :param goods_sales: {goods_id: count}
+    """
+    sku_sales = sku_sales or {}
+    if not settings.ORDER_SALES_BUFFERED:
+        add_sales(SKU, sku_sales)
+        add_sales(Goods, goods_sales)
+        return
+
+    def buffer():
+        pl = get_redis_connection('orders').pipeline()
+        for sku_id, count in sku_sales.items():
+            pl.hincrby(SKU_SALES_PENDING_KEY, sku_id, count)
+        for goods_id, count in goods_sales.items():
+            pl.hincrby(GOODS_SALES_PENDING_KEY, goods_id, count)
+        pl.execute()
+    transaction.on_commit(buffer)
+
+
+def get_pending_sales(model, ids):
+    """
+    读取还没有同步到mysql的销量,与mysql中的销量相加得到最新的销量
+    :param model: SKU或Goods
+    :return: {id: count}
+    """
+    ids = list(ids)
+    if not ids:
+        return {}
+    pl = get_redis_connection('orders').pipeline(transaction=False)
+    for key in SALES_KEYS[model]:
+        pl.hmget(key, ids)
+    pending = {}
+    for counts in pl.execute():
+        for obj_id, count in zip(ids, counts):
+            if count is not None:
+                pending[obj_id] = pending.get(obj_id, 0) + int(count)
+    return pending
+
+
+def merge_pending_sales(objs):
+    """
+    把还没有同步的销量加到商品或SPU对象的sales上
+    :param objs: 同一种模型的对象列表
+    """
+    if not objs:
+        return objs
+    pending = get_pending_sales(type(objs[0]), [obj.id for obj in objs])
+    for obj in objs:
+        obj.sales += pending.get(obj.id, 0)
+    return objs
+
+
+def flush_sales():
+    """
+    把redis中累加的销量批量同步到mysql,同一时间只有一个进程执行
+    每次同步有一个批次编号,与修改一起在mysql的事务中记录,mysql提交后才删除正在同步的数量
+    中断时下次重新同步同一个批次,已经提交过的批次只清理redis,不会重复累加
+    :return: (同步的商品数量, 同步的SPU数量) 或 None
+    """
+    redis_cli = get_redis_connection('orders')
+    lock = RedisLock(redis_cli, SALES_SYNC_LOCK_KEY, constants.SALES_SYNC_LOCK_EXPIRES)
+    if not lock.acquire():
+        return None
+    try:
+        batch_id, sku_items, goods_items = get_script(redis_cli, scripts.SALES_FLUSH_BEGIN)(
+            keys=[SKU_SALES_PENDING_KEY, SKU_SALES_FLUSHING_KEY, GOODS_SALES_PENDING_KEY, GOODS_SALES_FLUSHING_KEY,
+                  SALES_FLUSHING_BATCH_KEY],
+            args=[uuid.uuid4().hex], client=redis_cli)
+        if batch_id is None:
+            return 0, 0
+        sku_sales = {int(sku_id): int(count) for sku_id, count in zip(sku_items[::2], sku_items[1::2]) if int(count)}
+        goods_sales = {int(goods_id): int(count)
+                       for goods_id, count in zip(goods_items[::2], goods_items[1::2]) if int(count)}
+        with transaction.atomic():
+            if claim_sync_batch('sales', batch_id.decode()):
+                add_sales(SKU, sku_sales)
+                add_sales(Goods, goods_sales)
+            else:
+                logger.warning('销量批次%s已经同步过,跳过' % batch_id.decode())
+                sku_sales, goods_sales = {}, {}
+        redis_cli.delete(SKU_SALES_FLUSHING_KEY, GOODS_SALES_FLUSHING_KEY, SALES_FLUSHING_BATCH_KEY)
+    finally:
+        lock.release()
+    return len(sku_sales), len(goods_sales)
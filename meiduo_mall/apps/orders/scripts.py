@@ -0,0 +1,177 @@
+"""
+redis库存的lua脚本
+stock%d: 商品的可用库存
+stock_pending: hash, 已经在redis中扣减、还没有同步到mysql的数量, {sku_id: count}
+stock_flushing: hash, 正在同步到mysql的数量
+stock_seq: 同步序号, 奇数表示正在同步, 同步期间不能根据mysql中的库存加载计数器
+始终满足: 可用库存 = mysql中的库存 - stock_pending - stock_flushing
+"""
+
+# 扣减所有商品的库存,全部足够时才扣减
+# KEYS[1]: stock_pending, KEYS[2..n]: stock%d
+# ARGV: sku_id1, count1, sku_id2, count2, ...
+# 返回 {1} 成功, {0, sku_id1, stock1, ...} 库存不足, {-1, sku_id1, ...} 计数器还没有加载
+INVENTORY_DEDUCT = """
+local missing, shortages = {}, {}
+for i = 2, #KEYS do
+    local sku_id, count = ARGV[i * 2 - 3], tonumber(ARGV[i * 2 - 2])
+    local stock = redis.call('get', KEYS[i])
+    if not stock then
+        missing[#missing + 1] = sku_id
+    elseif tonumber(stock) < count then
+        shortages[#shortages + 1] = sku_id
+        shortages[#shortages + 1] = stock
+    end
+end
+if #missing > 0 then
+    return {-1, unpack(missing)}
+end
+if #shortages > 0 then
+    return {0, unpack(shortages)}
+end
+for i = 2, #KEYS do
+    redis.call('decrby', KEYS[i], ARGV[i * 2 - 2])
+    redis.call('hincrby', KEYS[1], ARGV[i * 2 - 3], ARGV[i * 2 - 2])
+end
+return {1}
+"""
+
+# 订单保存失败时归还库存
+# KEYS、ARGV与INVENTORY_DEDUCT相同
+INVENTORY_RELEASE = """
+for i = 2, #KEYS do
+    local sku_id, count = ARGV[i * 2 - 3], tonumber(ARGV[i * 2 - 2])
+    -- 计数器已经被删除时,下次加载会根据stock_pending重新计算
+    if redis.call('exists', KEYS[i]) == 1 then
+        redis.call('incrby', KEYS[i], count)
+    end
+    -- 扣减后stock_pending已经开始同步时,这里会变为负数,同步时把库存加回mysql
+    if redis.call('hincrby', KEYS[1], sku_id, -count) == 0 then
+        redis.call('hdel', KEYS[1], sku_id)
+    end
+end
+return 1
+"""
+
+# 根据mysql中的库存设置计数器,读取mysql前后同步序号不变时才设置
+# KEYS[1]: stock_pending, KEYS[2]: stock_flushing, KEYS[3]: stock_seq, KEYS[4..n]: stock%d
+# ARGV[1]: 读取mysql前的同步序号, ARGV[2]: 1覆盖已有的计数器, 0只设置不存在的计数器
+# ARGV[3..]: sku_id1, mysql库存1, sku_id2, mysql库存2, ...
+# 返回 {0} 序号变化, 或 {1, sku_id1, 原计数器1, 新计数器1, ...} 发生变化的计数器
+INVENTORY_LOAD = """
+if (redis.call('get', KEYS[3]) or '0') ~= ARGV[1] then
+    return {0}
+end
+local changed = {1}
+for i = 4, #KEYS do
+    local sku_id, stock = ARGV[i * 2 - 5], tonumber(ARGV[i * 2 - 4])
+    local expected = stock - tonumber(redis.call('hget', KEYS[1], sku_id) or 0)
+        - tonumber(redis.call('hget', KEYS[2], sku_id) or 0)
+    local current = redis.call('get', KEYS[i])
+    if not current or (ARGV[2] == '1' and tonumber(current) ~= expected) then
+        redis.call('set', KEYS[i], expected)
+        changed[#changed + 1] = sku_id
+        changed[#changed + 1] = current or ''
+        changed[#changed + 1] = expected
+    end
+end
+return changed
+"""
+
+# 开始同步,把待同步的数量移动到stock_flushing,同步序号变为奇数,并设置批次编号
+# 上次同步中断时stock_flushing还存在,直接返回上次的批次重新同步
+# KEYS[1]: stock_pending, KEYS[2]: stock_flushing, KEYS[3]: stock_seq, KEYS[4]: stock_flushing_batch
+# ARGV[1]: 新的批次编号
+# 返回 {批次编号, {sku_id1, count1, ...}}, 没有需要同步的数量时返回 {}
+INVENTORY_FLUSH_BEGIN = """
+if redis.call('exists', KEYS[2]) == 0 then
+    if redis.call('exists', KEYS[1]) == 0 then
+        return {}
+    end
+    redis.call('rename', KEYS[1], KEYS[2])
+    redis.call('set', KEYS[4], ARGV[1])
+elseif redis.call('exists', KEYS[4]) == 0 then
+    redis.call('set', KEYS[4], ARGV[1])
+end
+if tonumber(redis.call('get', KEYS[3]) or 0) % 2 == 0 then
+    redis.call('incr', KEYS[3])
+end
+return {redis.call('get', KEYS[4]), redis.call('hgetall', KEYS[2])}
+"""
+
+# 同步到mysql并提交后,删除stock_flushing与批次编号,同步序号变为偶数
+# KEYS[1]: stock_flushing, KEYS[2]: stock_seq, KEYS[3]: stock_flushing_batch
+INVENTORY_FLUSH_END = """
+redis.call('del', KEYS[1], KEYS[3])
+if tonumber(redis.call('get', KEYS[2]) or 0) % 2 == 1 then
+    redis.call('incr', KEYS[2])
+end
+return 1
+"""
+
+# 占用商品的下单名额,所有商品都有空闲名额时才占用
+# KEYS: order_slots%d, zset, 成员为任务, 分数为占用的时间(毫秒)
+# ARGV[1]: 当前时间(毫秒), ARGV[2]: 名额的有效期(毫秒), ARGV[3]: 每个商品的名额数, ARGV[4]: 任务标识
+SKU_SLOTS_ACQUIRE = """
+for i = 1, #KEYS do
+    redis.call('zremrangebyscore', KEYS[i], '-inf', tonumber(ARGV[1]) - tonumber(ARGV[2]))
+    if redis.call('zscore', KEYS[i], ARGV[4]) == false and redis.call('zcard', KEYS[i]) >= tonumber(ARGV[3]) then
+        return 0
+    end
+end
+for i = 1, #KEYS do
+    redis.call('zadd', KEYS[i], ARGV[1], ARGV[4])
+    redis.call('pexpire', KEYS[i], ARGV[2])
+end
+return 1
+"""
+
+# 取出到期的未支付订单,同时把它们的到期时间推迟到处理期限,处理完成后才删除
+# 进程在处理期间中断时,订单在处理期限之后重新被取出
+# KEYS[1]: order_deadlines
+# ARGV[1]: 当前时间, ARGV[2]: 最多取出的数量, ARGV[3]: 处理期限
+# 返回订单编号列表
+ORDER_DEADLINE_POP = """
+local order_ids = redis.call('zrangebyscore', KEYS[1], '-inf', ARGV[1], 'limit', 0, ARGV[2])
+for i = 1, #order_ids do
+    redis.call('zadd', KEYS[1], ARGV[3], order_ids[i])
+end
+return order_ids
+"""
+
+# 开始同步缓冲的销量,没有进行中的批次时把累加的数量改名为正在同步并设置批次编号
+# 上次同步没有完成时,返回上次的批次与数量重新同步,不开始新的批次
+# KEYS[1]: sku_sales_pending, KEYS[2]: sku_sales_flushing, KEYS[3]: goods_sales_pending, KEYS[4]: goods_sales_flushing
+# KEYS[5]: sales_flushing_batch
+# ARGV[1]: 新的批次编号
+# 返回 {批次编号(没有需要同步的数量时为nil), {sku_id1, count1, ...}, {goods_id1, count1, ...}}
+SALES_FLUSH_BEGIN = """
+if redis.call('exists', KEYS[5]) == 0 then
+    for i = 1, 3, 2 do
+        if redis.call('exists', KEYS[i + 1]) == 0 and redis.call('exists', KEYS[i]) == 1 then
+            redis.call('rename', KEYS[i], KEYS[i + 1])
+        end
+    end
+    if redis.call('exists', KEYS[2]) == 1 or redis.call('exists', KEYS[4]) == 1 then
+        redis.call('set', KEYS[5], ARGV[1])
+    end
+end
+return {redis.call('get', KEYS[5]), redis.call('hgetall', KEYS[2]), redis.call('hgetall', KEYS[4])}
+"""
+
+# 租用一个空闲的订单编号进程编号,从计数器的下一个编号开始依次尝试,最近释放的编号最后才会被重新使用
+# KEYS[1]: 进程编号的键前缀, order_id_worker:   KEYS[2]: 计数器
+# ARGV[1]: 进程编号的数量, ARGV[2]: 持有者标识, ARGV[3]: 租约有效期(秒)
+# 返回租到的编号,全部被占用时返回-1
+ORDER_ID_WORKER_ALLOCATE = """
+local limit = tonumber(ARGV[1])
+local start = redis.call('incr', KEYS[2])
+for i = 0, limit - 1 do
+    local worker_id = (start + i) % limit
+    if redis.call('set', KEYS[1] .. worker_id, ARGV[2], 'NX', 'EX', ARGV[3]) then
+        redis.call('set', KEYS[2], worker_id)
+        return worker_id
+    end
+end
+return -1
+"""
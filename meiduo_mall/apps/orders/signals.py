@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django_redis import get_redis_connection
+from goods.models import SKU
+from .inventory import STOCK_KEY
+
+
+def delete_stock_counter(sku_id):
+    get_redis_connection('orders').delete(STOCK_KEY % sku_id)
+
+
+@receiver([post_save, post_delete], sender=SKU)
+def sku_changed(sender, instance, **kwargs):
+    """
+    后台修改库存后删除redis中的库存计数器,下单时根据mysql中的库存重新加载
+    下单与同步库存使用update,不会触发这个信号
+    """
+    if settings.ORDER_INVENTORY_MODE != 'redis':
+        return
+    sku_id = instance.id
+    transaction.on_commit(lambda: delete_stock_counter(sku_id))
@@ -3,5 +3,7 @@ from . import views
 
 urlpatterns = [
     url('^orders/settlement/$', views.OrderSettlementView.as_view()),
-    url('^orders/$', views.OrderSaveView.as_view())
+    url('^orders/$', views.OrderSaveView.as_view()),
+    url('^orders/tickets/(?P<ticket>[0-9a-f]{32})/$', views.OrderTicketView.as_view()),
+    url('^user/orders/$', views.UserOrderListView.as_view()),
 ]
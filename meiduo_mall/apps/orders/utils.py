@@ -0,0 +1,89 @@
+import datetime
+import random
+import time
+from django.db import connection, OperationalError
+from django.db.models import Case, When, F, IntegerField
+from django.utils import timezone
+from goods.models import SKU
+from .models import SyncBatch
+from . import constants
+
+# mysql的锁等待超时与死锁错误码
+LOCK_CONFLICT_ERRORS = (1205, 1213)
+
+
+class InsufficientStock(Exception):
+    """
+    库存不足,shortages: {sku_id: 当前可用库存}
+    """
+    def __init__(self, shortages):
+        super().__init__(shortages)
+        self.shortages = shortages
+
+
+def reserve_stock(cart_dict, update_sales=True):
+    """
+    扣减选中商品的库存,增加销量,需要在事务中调用
+    按商品编号顺序锁定所有商品,多个订单同时扣减时不会死锁
+    只执行一条加锁查询和一条更新语句,与商品数量无关
+    :param cart_dict: {sku_id: count}
+    :param update_sales: 是否同时增加销量,销量缓冲在redis中时为False
+    :return: {sku_id: sku}, 扣减前的商品对象
+    """
+    sku_ids = sorted(cart_dict)
+    skus = {sku.id: sku for sku in SKU.objects.select_for_update().filter(id__in=sku_ids).order_by('id')}
+
+    # 检查所有商品,一次报告全部库存不足的商品,已删除或下架的商品按没有库存处理
+    shortages = {}
+    for sku_id in sku_ids:
+        sku = skus.get(sku_id)
+        stock = sku.stock if sku is not None and sku.is_launched else 0
+        if stock < cart_dict[sku_id]:
+            shortages[sku_id] = stock
+    if shortages:
+        raise InsufficientStock(shortages)
+
+    fields = {
+        'stock': Case(*[When(id=sku_id, then=F('stock') - cart_dict[sku_id]) for sku_id in sku_ids],
+                      output_field=IntegerField()),
+    }
+    if update_sales:
+        fields['sales'] = Case(*[When(id=sku_id, then=F('sales') + cart_dict[sku_id]) for sku_id in sku_ids],
+                               output_field=IntegerField())
+    SKU.objects.filter(id__in=sku_ids).update(**fields)
+    return skus
+
+
+def is_lock_conflict(exc):
+    return bool(exc.args) and exc.args[0] in LOCK_CONFLICT_ERRORS
+
+
+def retry_on_conflict(func, *args, **kwargs):
+    """
+    执行一个完整的事务,锁冲突时回滚后等待一段时间重试,重试次数有限
+    已经在外层事务中时不能单独重试,直接抛出异常
+    """
+    for attempt in range(constants.ORDER_CONFLICT_RETRIES):
+        try:
+            return func(*args, **kwargs)
+        except OperationalError as e:
+            if (not is_lock_conflict(e) or connection.in_atomic_block
+                    or attempt == constants.ORDER_CONFLICT_RETRIES - 1):
+                raise
+            # 随机等待,避免冲突的请求同时重试
+            time.sleep(constants.ORDER_CONFLICT_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def claim_sync_batch(name, batch_id):
+    """
+    记录一个redis批次已经同步到mysql,需要在同步的事务中调用,同时删除过期的记录
+    :param name: 同步类型, inventory或sales
+    :param batch_id: 批次编号
+    :return: 批次已经同步过时返回False
+    """
+    if SyncBatch.objects.filter(batch_id=batch_id).exists():
+        return False
+    SyncBatch.objects.create(name=name, batch_id=batch_id)
+    SyncBatch.objects.filter(
+        name=name, create_time__lt=timezone.now() - datetime.timedelta(days=constants.SYNC_BATCH_KEEP_DAYS)).delete()
+    return True
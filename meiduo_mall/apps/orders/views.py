@@ -1,39 +1,45 @@
-from rest_framework.generics import CreateAPIView
+from django.conf import settings
+from django.http import Http404
+from rest_framework import status
+from django.db.models import Prefetch
+from rest_framework.generics import CreateAPIView, ListAPIView
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django_redis import get_redis_connection
 from carts.serializers import CartSKUSerializer
+from carts.storage import RedisCart
 
-from goods.models import SKU
-from orders.serializers import OrderSaveSerializer
+from goods.mixins import SKUCardPrefetchMixin
+from goods.utils import get_sku_cards
+from utils.pagination import KeysetPagination
+from orders.models import OrderInfo, OrderGoods, ArchivedOrderInfo, ArchivedOrderGoods
+from orders.serializers import OrderSaveSerializer, OrderListSerializer
+from orders.placement import get_ticket
+from orders.quotes import create_quote
+from orders.constants import ORDER_FREIGHT
 
 
 class OrderSettlementView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        # 连接redis数据库
-        redis_cli = get_redis_connection('carts')
-        # 获取商品的编号与数量
-        cart_dict = redis_cli.hgetall('cart%d' % request.user.id)
-        cart_dict2 = {}
-        for k, v in cart_dict.items():
-            cart_dict2[int(k)] = int(v)
-        # 获取选中的商品
-        cart_selected = redis_cli.smembers('cart_selected%d' % request.user.id)
-        # 查询商品对象
-        skus = SKU.objects.filter(pk__in=cart_selected)
-        for sku in skus:
-            sku.count = cart_dict2.get(sku.id)
-            sku.selected = True
+        # 从redis中获取选中的商品编号与数量
+        cart_selected = RedisCart(request.user.id).selected_items()
+        # 从缓存中批量读取商品信息
+        cards = get_sku_cards(cart_selected.keys())
+        skus = []
+        for sku_id, count in cart_selected.items():
+            if sku_id in cards:
+                skus.append(dict(cards[sku_id], count=count, selected=True))
 
         # 构造响应结果
         serializer = CartSKUSerializer(skus, many=True)
 
         result = {
-            'freight': 10,
-            'skus': serializer.data
+            'freight': ORDER_FREIGHT,
+            'skus': serializer.data,
+            # 下单时提交报价编号,不需要重新读取购物车与价格
+            'quote_id': create_quote(request.user.id, cart_selected, cards, ORDER_FREIGHT),
         }
 
         # 返回结果
@@ -43,3 +49,61 @@ class OrderSettlementView(APIView):
 class OrderSaveView(CreateAPIView):
     serializer_class = OrderSaveSerializer
     permission_classes = [IsAuthenticated]
+
+    def create(self, request, *args, **kwargs):
+        if not settings.ORDER_PLACEMENT_ASYNC:
+            return super().create(request, *args, **kwargs)
+
+        # 异步下单:只验证请求数据,提交任务后立即返回下单凭证
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ticket = serializer.enqueue()
+        return Response({'ticket': ticket}, status=status.HTTP_202_ACCEPTED)
+
+
+class OrderTicketView(APIView):
+    """
+    查询异步下单的结果
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, ticket):
+        """
+        :param ticket: 下单凭证
+        :return: status: queued/processing/created/failed, 成功时返回order_id, 失败时返回reason
+        """
+        data = get_ticket(ticket)
+        if data is None or data.get('user_id') != str(request.user.id):
+            raise Http404()
+
+        result = {'status': data['status']}
+        if 'order_id' in data:
+            result['order_id'] = data['order_id']
+        if 'reason' in data:
+            result['reason'] = data['reason']
+        return Response(result)
+
+
+class OrderListPagination(KeysetPagination):
+    ordering = ('-create_time', '-order_id')
+
+
+class UserOrderListView(SKUCardPrefetchMixin, ListAPIView):
+    """
+    用户订单列表,按照下单时间倒序,包括已经归档的订单
+    订单表与归档表分别查询一页后合并,每页的查询次数固定
+    """
+    serializer_class = OrderListSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = OrderListPagination
+
+    def get_queryset(self):
+        # 返回订单表与归档表两个查询集,由OrderListPagination合并
+        querysets = []
+        for model, goods_model in ((OrderInfo, OrderGoods), (ArchivedOrderInfo, ArchivedOrderGoods)):
+            goods = goods_model.objects.only('order_id', 'sku_id', 'count', 'price').order_by('id')
+            querysets.append(model.objects.filter(user=self.request.user).prefetch_related(Prefetch('skus', goods)))
+        return querysets
+
+    def get_page_sku_ids(self, page):
+        return {goods.sku_id for order in page for goods in order.skus.all()}
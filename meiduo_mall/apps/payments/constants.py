@@ -0,0 +1,25 @@
+# 签名后的支付宝支付参数的缓存时间,用户重复打开支付页面时不重新签名
+ALIPAY_ORDER_STRING_EXPIRES = 60 * 5
+
+# 每批处理的支付通知数量,每次任务最多处理的批数
+PAYMENT_NOTIFY_BATCH = 200
+PAYMENT_NOTIFY_MAX_BATCHES = 50
+
+# 处理支付通知的锁的有效期,进程中断时自动释放,每批开始前续期
+PAYMENT_NOTIFY_LOCK_EXPIRES = 60
+
+# 每次任务处理支付通知的最长秒数,超过后不再开始新的批次,剩余的通知由下次任务处理
+PAYMENT_NOTIFY_MAX_SECONDS = 20
+
+# 已处理的支付宝交易编号在redis中保留的天数,支付宝重复通知时直接忽略
+PAYMENT_TRADE_IDS_DAYS = 2
+
+# 查询支付网关的超时秒数
+PAYMENT_GATEWAY_TIMEOUT = 15
+
+# 核对支付结果时每页的订单数量与同时查询的线程数
+PAYMENT_RECONCILE_BATCH = 200
+PAYMENT_RECONCILE_WORKERS = 8
+
+# 只核对创建超过这个分钟数的订单,给支付宝的异步通知留出时间
+PAYMENT_RECONCILE_DELAY_MINUTES = 5
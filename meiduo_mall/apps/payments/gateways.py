@@ -0,0 +1,49 @@
+import json
+from urllib.request import urlopen
+from django.conf import settings
+from django.utils.module_loading import import_string
+from .utils import get_alipay
+from . import constants
+
+# 支付宝交易查询接口中已经支付的交易状态
+ALIPAY_PAID_STATUSES = ('TRADE_SUCCESS', 'TRADE_FINISHED')
+
+
+class AlipayGatewayClient(object):
+    """
+    通过支付宝交易查询接口查询订单的支付结果
+    """
+    def query(self, order_id):
+        """
+        :return: 支付宝交易编号,没有支付时返回None,查询失败时抛出异常
+        """
+        response = get_alipay().api_alipay_trade_query(out_trade_no=order_id)
+        if response.get('code') == '10000' and response.get('trade_status') in ALIPAY_PAID_STATUSES:
+            return response['trade_no']
+        return None
+
+
+class HttpGatewayClient(object):
+    """
+    查询PAYMENT_GATEWAY_URL指定的支付网关,用于测试时对接script/fake_gateway.py
+    GET <PAYMENT_GATEWAY_URL>/trades/<order_id>/ 返回 {"trade_no":, "trade_status":}
+    """
+    def query(self, order_id):
+        url = '%s/trades/%s/' % (settings.PAYMENT_GATEWAY_URL.rstrip('/'), order_id)
+        response = json.loads(urlopen(url, timeout=constants.PAYMENT_GATEWAY_TIMEOUT).read().decode())
+        if response.get('trade_status') in ALIPAY_PAID_STATUSES:
+            return response['trade_no']
+        return None
+
+
+_client = None
+
+
+def get_gateway_client():
+    """
+    使用PAYMENT_GATEWAY_CLIENT查询支付结果,每个进程一个实例,需要可以在多个线程中使用
+    """
+    global _client
+    if _client is None:
+        _client = import_string(settings.PAYMENT_GATEWAY_CLIENT)()
+    return _client
@@ -0,0 +1,33 @@
+import datetime
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from payments.reconcile import reconcile_payments
+from payments import constants
+
+
+class Command(BaseCommand):
+    """
+    向支付网关查询仍未支付的支付宝订单,补存丢失通知的支付记录
+    按订单编号分页,每页同时查询多个订单,修改在每页一个的短事务中完成
+    """
+    help = '核对未支付订单的支付结果'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutes', type=int, default=constants.PAYMENT_RECONCILE_DELAY_MINUTES,
+                            help='只核对创建超过这个分钟数的订单')
+        parser.add_argument('--batch', type=int, default=constants.PAYMENT_RECONCILE_BATCH, help='每页的订单数量')
+        parser.add_argument('--workers', type=int, default=constants.PAYMENT_RECONCILE_WORKERS,
+                            help='同时查询支付网关的线程数')
+        parser.add_argument('--dry-run', action='store_true', help='只查询,不修改订单')
+
+    def handle(self, *args, **options):
+        before = timezone.now() - datetime.timedelta(minutes=options['minutes'])
+        stats = reconcile_payments(before, options['batch'], options['workers'], dry_run=options['dry_run'],
+                                   progress=self.report)
+        self.report(stats)
+
+    def report(self, stats):
+        seconds = stats['seconds'] or 1e-6
+        self.stdout.write('核对%d个订单, 已支付%d个, 已取消%d个, 查询失败%d个, 耗时%.2f秒, 每秒%.0f个' % (
+            stats['checked'], stats['paid'], stats['canceled'], stats['failed'], stats['seconds'],
+            stats['checked'] / seconds))
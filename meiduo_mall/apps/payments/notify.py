@@ -0,0 +1,128 @@
+import datetime
+import json
+import logging
+import time
+from django.db import transaction
+from django_redis import get_redis_connection
+from utils.redis_script import get_script
+from orders.cancellation import unschedule_cancel
+from orders.models import OrderInfo
+from utils.redis_lock import RedisLock
+from .models import Payment
+from . import constants, scripts
+
+logger = logging.getLogger('django')
+
+# list, 等待处理的支付通知, 新的通知从左侧加入
+PAYMENT_NOTIFY_QUEUE_KEY = 'payment_notify_queue'
+PAYMENT_NOTIFY_PROCESSING_KEY = 'payment_notify_processing'
+PAYMENT_NOTIFY_LOCK_KEY = 'payment_notify_lock'
+# set, 每天处理过的支付宝交易编号
+PAYMENT_TRADE_IDS_KEY = 'payment_trade_ids_%s'
+
+
+def enqueue_payment(order_id, trade_id):
+    """
+    保存验证过签名的支付通知,由process_payments处理
+    :return: 加入后队列中的通知数量
+    """
+    return get_redis_connection('orders').lpush(
+        PAYMENT_NOTIFY_QUEUE_KEY, json.dumps({'order_id': order_id, 'trade_id': trade_id}))
+
+
+def save_payments(events):
+    """
+    在一个事务中保存一批支付记录,并把未支付的订单改为待发货
+    先给订单行加锁,与超时取消、其它批次中同一订单的通知互斥,
+    再用加锁读查询已经保存过的交易编号,读到的是其它事务已经提交的最新数据,不重复保存
+    :param events: [(order_id, trade_id), ...]
+    :return: (改为待发货的订单编号列表, 已经取消的订单编号列表)
+    """
+    unpaid_status = OrderInfo.ORDER_STATUS_ENUM['UNPAID']
+    # 同一批中重复的通知只保留一个
+    trades = {trade_id: order_id for order_id, trade_id in events}
+    order_ids = sorted(set(trades.values()))
+    with transaction.atomic():
+        statuses = dict(OrderInfo.objects.select_for_update().filter(order_id__in=order_ids)
+                        .order_by('order_id').values_list('order_id', 'status'))
+        existing = set(Payment.objects.select_for_update().filter(trade_id__in=list(trades))
+                       .values_list('trade_id', flat=True))
+        trades = {trade_id: order_id for trade_id, order_id in trades.items() if trade_id not in existing}
+        order_ids = sorted(set(trades.values()))
+        if not order_ids:
+            return [], []
+
+        Payment.objects.bulk_create([Payment(order_id=order_id, trade_id=trade_id)
+                                     for trade_id, order_id in trades.items() if order_id in statuses])
+        paid = [order_id for order_id in order_ids if statuses.get(order_id) == unpaid_status]
+        if paid:
+            OrderInfo.objects.filter(order_id__in=paid, status=unpaid_status).update(
+                status=OrderInfo.ORDER_STATUS_ENUM['UNSEND'])
+
+    missing = [order_id for order_id in order_ids if order_id not in statuses]
+    if missing:
+        logger.warning('支付通知中的订单不存在: %s' % missing)
+    if paid:
+        unschedule_cancel(*paid)
+    canceled = [order_id for order_id in order_ids
+                if statuses.get(order_id) == OrderInfo.ORDER_STATUS_ENUM['CANCELED']]
+    return paid, canceled
+
+
+def trade_ids_keys(days):
+    today = datetime.date.today()
+    return [PAYMENT_TRADE_IDS_KEY % (today - datetime.timedelta(days=i)).strftime('%Y%m%d') for i in range(days)]
+
+
+def process_payments():
+    """
+    分批处理队列中的支付通知,同一时间只有一个进程执行
+    已经处理过的交易编号在redis中过滤,其余的每批一个事务批量保存
+    处理完成后才从处理中的列表删除,中断时下次重新处理,重复处理不会重复保存
+    每批开始前续期锁,锁已经被其它进程获得时停止;运行超过PAYMENT_NOTIFY_MAX_SECONDS后不再开始新的批次
+    :return: 处理的通知数量,其它进程正在处理时返回None
+    """
+    redis_cli = get_redis_connection('orders')
+    lock = RedisLock(redis_cli, PAYMENT_NOTIFY_LOCK_KEY, constants.PAYMENT_NOTIFY_LOCK_EXPIRES)
+    if not lock.acquire():
+        return None
+
+    total = 0
+    keys = trade_ids_keys(constants.PAYMENT_TRADE_IDS_DAYS)
+    deadline = time.time() + constants.PAYMENT_NOTIFY_MAX_SECONDS
+    try:
+        for _ in range(constants.PAYMENT_NOTIFY_MAX_BATCHES):
+            if time.time() > deadline or not lock.refresh():
+                break
+            items = get_script(redis_cli, scripts.PAYMENT_NOTIFY_POP)(
+                keys=[PAYMENT_NOTIFY_QUEUE_KEY, PAYMENT_NOTIFY_PROCESSING_KEY],
+                args=[constants.PAYMENT_NOTIFY_BATCH], client=redis_cli)
+            if not items:
+                break
+            events = [json.loads(item.decode()) for item in items]
+
+            pl = redis_cli.pipeline(transaction=False)
+            for event in events:
+                for key in keys:
+                    pl.sismember(key, event['trade_id'])
+            seen = pl.execute()
+            events = [event for i, event in enumerate(events) if not any(seen[i * len(keys):(i + 1) * len(keys)])]
+
+            if events:
+                paid, canceled = save_payments([(event['order_id'], event['trade_id']) for event in events])
+                for order_id in canceled:
+                    # 支付前订单已经超时取消,支付记录已保存,需要退款
+                    logger.warning('订单%s已经取消,收到支付' % order_id)
+                pl = redis_cli.pipeline()
+                pl.sadd(keys[0], *[event['trade_id'] for event in events])
+                pl.expire(keys[0], constants.PAYMENT_TRADE_IDS_DAYS * 24 * 60 * 60)
+                pl.execute()
+
+            # 锁已经过期时处理中的列表可能属于其它进程,不能删除
+            if not lock.refresh():
+                break
+            redis_cli.delete(PAYMENT_NOTIFY_PROCESSING_KEY)
+            total += len(items)
+    finally:
+        lock.release()
+    return total
@@ -0,0 +1,70 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from orders.models import OrderInfo
+from .gateways import get_gateway_client
+from .notify import save_payments
+
+logger = logging.getLogger('django')
+
+
+def query_payments(client, order_ids, pool):
+    """
+    在线程池中同时查询多个订单的支付结果,只访问支付网关,不使用数据库连接
+    :return: ({order_id: trade_id}, 查询失败的数量)
+    """
+    def query(order_id):
+        try:
+            return client.query(order_id), False
+        except Exception as e:
+            logger.warning('查询订单%s的支付结果失败: %s' % (order_id, e))
+            return None, True
+
+    results = list(pool.map(query, order_ids))
+    trades = {order_id: trade_id for order_id, (trade_id, _) in zip(order_ids, results) if trade_id}
+    return trades, sum(failed for _, failed in results)
+
+
+def reconcile_payments(before, batch, workers, dry_run=False, client=None, progress=None):
+    """
+    核对在before之前创建、仍未支付的支付宝订单,已经支付的订单补存支付记录并改为待发货
+    按订单编号分页读取,不在事务中查询支付网关,每页的修改在一个短事务中完成
+    :param batch: 每页的订单数量
+    :param workers: 同时查询支付网关的线程数
+    :param progress: 每页处理完成后调用,参数为当前的统计
+    :return: {'checked':, 'paid':, 'canceled':, 'failed':, 'seconds':}
+    """
+    client = client or get_gateway_client()
+    queryset = OrderInfo.objects.filter(
+        status=OrderInfo.ORDER_STATUS_ENUM['UNPAID'],
+        pay_method=OrderInfo.PAY_METHODS_ENUM['ALIPAY'],
+        create_time__lt=before,
+    )
+    stats = {'checked': 0, 'paid': 0, 'canceled': 0, 'failed': 0, 'seconds': 0}
+    start = time.time()
+    last = ''
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            order_ids = list(queryset.filter(order_id__gt=last).order_by('order_id')
+                             .values_list('order_id', flat=True)[:batch])
+            if not order_ids:
+                break
+            last = order_ids[-1]
+
+            trades, failed = query_payments(client, order_ids, pool)
+            stats['checked'] += len(order_ids)
+            stats['failed'] += failed
+            if trades and not dry_run:
+                paid, canceled = save_payments([(order_id, trade_id) for order_id, trade_id in trades.items()])
+                stats['paid'] += len(paid)
+                stats['canceled'] += len(canceled)
+                for order_id in canceled:
+                    logger.warning('订单%s已经取消,支付网关显示已支付' % order_id)
+            elif trades:
+                stats['paid'] += len(trades)
+
+            stats['seconds'] = time.time() - start
+            if progress:
+                progress(stats)
+    stats['seconds'] = time.time() - start
+    return stats
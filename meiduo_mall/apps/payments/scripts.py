@@ -0,0 +1,25 @@
+"""
+支付通知队列的lua脚本
+"""
+
+# 取出一批支付通知,放入处理中的列表,处理完成后删除
+# 上次处理中断时,先返回处理中的列表中的通知重新处理
+# KEYS[1]: payment_notify_queue, KEYS[2]: payment_notify_processing
+# ARGV[1]: 最多取出的数量
+# 返回通知列表,按进入队列的顺序
+PAYMENT_NOTIFY_POP = """
+if redis.call('exists', KEYS[2]) == 0 then
+    local items = redis.call('lrange', KEYS[1], -tonumber(ARGV[1]), -1)
+    if #items == 0 then
+        return items
+    end
+    redis.call('ltrim', KEYS[1], 0, -#items - 1)
+    redis.call('rpush', KEYS[2], unpack(items))
+end
+local items = redis.call('lrange', KEYS[2], 0, -1)
+local result = {}
+for i = #items, 1, -1 do
+    result[#result + 1] = items[i]
+end
+return result
+"""
@@ -0,0 +1,76 @@
+import os
+import threading
+from alipay import AliPay
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from . import constants
+
+ALIPAY_ORDER_STRING_KEY = 'alipay_order_string_%s_%s_%s_%s'
+
+# 进程内缓存的支付宝客户端, {(appid, debug): (密钥文件的修改时间, 客户端)}
+_alipay_clients = {}
+_alipay_lock = threading.Lock()
+
+
+def get_alipay_key_paths():
+    """
+    :return: (应用私钥文件, 支付宝公钥文件)
+    """
+    return (
+        os.path.join(settings.BASE_DIR, 'apps/payments/keys/app_private_key.pem'),
+        os.path.join(settings.BASE_DIR, 'apps/payments/keys/alipay_public_key.pem'),
+    )
+
+
+def get_alipay():
+    """
+    获取支付宝客户端,每个进程只读取、解析一次密钥文件,密钥文件修改后重新加载
+    客户端签名与验签时不修改自身状态,可以在多个线程中共用
+    """
+    private_key_path, public_key_path = get_alipay_key_paths()
+    mtimes = (os.stat(private_key_path).st_mtime_ns, os.stat(public_key_path).st_mtime_ns)
+    key = (settings.ALIPAY_APPID, settings.ALIPAY_DEBUG)
+
+    with _alipay_lock:
+        cached = _alipay_clients.get(key)
+        if cached is None or cached[0] != mtimes:
+            alipay = AliPay(
+                appid=settings.ALIPAY_APPID,
+                app_notify_url=None,  # 默认回调url
+                app_private_key_path=private_key_path,
+                alipay_public_key_path=public_key_path,
+                sign_type="RSA2",
+                debug=settings.ALIPAY_DEBUG
+            )
+            # 密钥的版本,更换密钥后缓存的签名失效
+            alipay.key_version = '%d.%d' % mtimes
+            cached = _alipay_clients[key] = (mtimes, alipay)
+        return cached[1]
+
+
+def get_alipay_order_string(order_id, total_amount, deadline):
+    """
+    获取签名后的支付参数,同一订单、金额在ALIPAY_ORDER_STRING_EXPIRES内使用缓存的签名
+    支付宝在支付期限后关闭交易,缓存时间不超过剩余的支付时间
+    :param deadline: 支付期限,带时区的datetime
+    :return: 拼接在ALIPAY_URL之后的参数字符串,已经超过支付期限时返回None
+    """
+    remaining = int((deadline - timezone.now()).total_seconds())
+    if remaining <= 0:
+        return None
+    alipay = get_alipay()
+    # 支付宝使用北京时间
+    time_expire = timezone.localtime(deadline).strftime('%Y-%m-%d %H:%M:%S')
+    key = ALIPAY_ORDER_STRING_KEY % (order_id, total_amount, time_expire.replace(' ', '_'), alipay.key_version)
+    order_string = cache.get(key)
+    if order_string is None:
+        order_string = alipay.api_alipay_trade_page_pay(
+            out_trade_no=order_id,
+            total_amount=str(total_amount),  # 总金额,转字符串
+            subject="美多商城支付" + order_id,
+            return_url=settings.RETURN_URL,
+            time_expire=time_expire
+        )
+        cache.set(key, order_string, min(constants.ALIPAY_ORDER_STRING_EXPIRES, remaining))
+    return order_string
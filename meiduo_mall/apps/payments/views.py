@@ -1,26 +1,17 @@
-import os
+import logging
 
 from rest_framework import serializers
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from alipay import AliPay
+from orders.cancellation import get_payment_deadline
 from orders.models import OrderInfo
 from django.conf import settings
 
-from payments.models import Payment
+from payments.notify import enqueue_payment, save_payments
+from payments.utils import get_alipay, get_alipay_order_string
+from celery_tasks.payments.tasks import process_payments_task
 
-
-def get_alipay():
-    alipay = AliPay(
-        appid=settings.ALIPAY_APPID,
-        app_notify_url=None,  # 默认回调url
-        app_private_key_path=os.path.join(settings.BASE_DIR, 'apps/payments/keys/app_private_key.pem'),
-        alipay_public_key_path=os.path.join(settings.BASE_DIR, 'apps/payments/keys/alipay_public_key.pem'),
-        sign_type="RSA2",
-        debug=settings.ALIPAY_DEBUG
-    )
-
-    return alipay
+logger = logging.getLogger('django')
 
 
 class AlipayUrlView(APIView):
@@ -32,14 +23,12 @@ class AlipayUrlView(APIView):
             order = OrderInfo.objects.get(pk=order_id)
         except:
             raise serializers.ValidationError('订单编号无效')
-        total_amout = order.total_amount
-        alipay = get_alipay()
-        order_string = alipay.api_alipay_trade_page_pay(
-            out_trade_no=order_id,
-            total_amount=str(total_amout),  # 总金额,转字符串
-            subject="美多商城支付" + order_id,
-            return_url=settings.RETURN_URL
-        )
+        if order.status != OrderInfo.ORDER_STATUS_ENUM['UNPAID']:
+            raise serializers.ValidationError('订单不是待支付状态')
+        # 重复打开支付页面时使用缓存的签名
+        order_string = get_alipay_order_string(order_id, order.total_amount, get_payment_deadline(order))
+        if order_string is None:
+            raise serializers.ValidationError('订单已超过支付期限')
 
         alipay_url = settings.ALIPAY_URL + order_string
 
@@ -66,11 +55,18 @@ class PaymentStatusView(APIView):
         alipay = get_alipay()
         success = alipay.verify(data, signature)
         if success:
-            # 如果验证成功,则保存订单编号对应的支付宝交易编号
-            Payment.objects.create(
-                order_id=order_id,
-                trade_id=trade_id
-            )
+            if settings.PAYMENT_NOTIFY_ASYNC:
+                # 验证成功后加入队列立即返回,由celery任务批量保存,队列原来为空时提交任务
+                if enqueue_payment(order_id, trade_id) == 1:
+                    process_payments_task.delay()
+                return Response({'trade_id': trade_id})
+
+            # 如果验证成功,则保存订单编号对应的支付宝交易编号,并把订单改为待发货,重复通知时不重复保存
+            paid, canceled = save_payments([(order_id, trade_id)])
+            if canceled:
+                # 支付前订单已经超时取消,支付记录已保存,需要退款
+                logger.warning('订单%s已经取消,收到支付%s' % (order_id, trade_id))
+                raise serializers.ValidationError('订单已超时取消')
             # 响应
             return Response({'trade_id': trade_id})
         else:
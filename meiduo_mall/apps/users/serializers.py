@@ -1,9 +1,10 @@
 import re
+from django.conf import settings
 from django_redis import get_redis_connection
 from rest_framework import serializers
 from rest_framework_jwt.settings import api_settings
 from celery_tasks.email.tasks import send_verify_email
-from goods.models import SKU
+from goods.utils import is_launched_sku
 from .models import Address
 from users.models import User
 
@@ -192,9 +193,8 @@ class AddUserBrowsingHistorySerializer(serializers.Serializer):
     sku_id = serializers.IntegerField(min_value=1)
 
     def validate_sku_id(self, value):
-        try:
-            SKU.objects.get(pk=value)
-        except:
+        # 使用上架商品索引判断,不查询数据库
+        if not is_launched_sku(value):
             raise serializers.ValidationError('商品编号无效')
         return value
 
@@ -222,6 +222,9 @@ class AddUserBrowsingHistorySerializer(serializers.Serializer):
         pl.lrem(key, 0, sku_id)
         pl.lpush(key, sku_id)
         pl.ltrim(key, 0, 4)
+        # 每次浏览刷新有效期,长期不登录的用户的浏览记录自动过期
+        if settings.HISTORY_RETENTION:
+            pl.expire(key, settings.HISTORY_RETENTION)
         pl.execute()
 
         return validated_data
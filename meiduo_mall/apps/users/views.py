@@ -4,7 +4,7 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework_jwt.views import ObtainJSONWebToken
-from goods.models import SKU
+from goods.utils import get_sku_cards
 from goods.serializers import SKUSerializer
 from .models import User
 from rest_framework.generics import CreateAPIView, RetrieveAPIView, UpdateAPIView
@@ -204,10 +204,9 @@ class UserBrowsingHistoryView(CreateAPIView):
         redis_cli = get_redis_connection('history')
         # 获取当前用户所有浏览记录，返回列表[1,2,3,4]
         sku_ids = redis_cli.lrange('history%d' % request.user.id, 0, -1)
-        # 查询商品对象
-        skus = []
-        for sku_id in sku_ids:
-            skus.append(SKU.objects.get(pk=sku_id))
+        # 从缓存中批量读取商品信息,保持浏览的顺序
+        cards = get_sku_cards(sku_ids)
+        skus = [cards[int(sku_id)] for sku_id in sku_ids if int(sku_id) in cards]
         # 输出json
         sku_serializer = SKUSerializer(skus, many=True)
         return Response(sku_serializer.data)
@@ -1,2 +1,26 @@
 # 配置代理人,指定代理人将任务存储在哪里
 broker_url = 'redis://127.0.0.1:6379/3'
+
+# 定时任务,需要同时启动celery beat
+beat_schedule = {
+    # redis库存模式下,每分钟把扣减的库存同步到mysql
+    'sync_inventory': {
+        'task': 'sync_inventory',
+        'schedule': 60,
+    },
+    # 取消超过支付期限的未支付订单
+    'cancel_expired_orders': {
+        'task': 'cancel_expired_orders',
+        'schedule': 30,
+    },
+    # 把缓冲的销量同步到mysql
+    'flush_sales': {
+        'task': 'flush_sales',
+        'schedule': 60,
+    },
+    # 处理队列中剩余的支付通知,通知到达时也会提交任务
+    'process_payments': {
+        'task': 'process_payments',
+        'schedule': 10,
+    },
+}
@@ -0,0 +1,21 @@
+from celery_tasks.main import app
+from django.conf import settings
+
+from orders import inventory
+
+
+@app.task(name='sync_inventory')
+def sync_inventory():
+    """
+    把redis中扣减的库存同步到mysql,并修正不一致的库存计数器
+    只在ORDER_INVENTORY_MODE为redis时执行
+    """
+    if settings.ORDER_INVENTORY_MODE != 'redis':
+        return None
+
+    result = inventory.sync_inventory()
+    if result is None:
+        # 上一次同步还没有结束
+        return None
+    flushed, drift = result
+    return {'flushed': flushed, 'drift': len(drift)}
@@ -16,4 +16,7 @@ app.autodiscover_tasks([
     'celery_tasks.sms',
     'celery_tasks.email',
     'celery_tasks.html',
+    'celery_tasks.inventory',
+    'celery_tasks.orders',
+    'celery_tasks.payments',
 ])
@@ -0,0 +1,79 @@
+import logging
+from decimal import Decimal
+from celery_tasks.main import app
+from django.conf import settings
+
+from orders import constants
+from orders.cancellation import cancel_expired_orders
+from orders.sales import flush_sales
+from orders.placement import place_order, placement_error, update_ticket, claim_ticket, acquire_sku_slots, \
+    release_sku_slots
+from users.models import User, Address
+
+logger = logging.getLogger('django')
+
+
+@app.task(name='place_order', bind=True, max_retries=constants.ORDER_SLOT_RETRIES)
+def place_order_task(self, ticket, user_id, address_id, pay_method, cart_items, prices=None,
+                     freight=constants.ORDER_FREIGHT):
+    """
+    异步下单,结果写入下单凭证
+    同一商品同时下单的任务数量不超过ORDER_SKU_CONCURRENCY,没有名额时重新排队
+    :param ticket: 下单凭证
+    :param cart_items: [(sku_id, count), ...]
+    :param prices: 结算报价中的单价 [(sku_id, price), ...]
+    """
+    cart_dict = dict(cart_items)
+    if prices is not None:
+        prices = {sku_id: Decimal(price) for sku_id, price in prices}
+    token = self.request.id or ticket
+    if not claim_ticket(ticket, token):
+        # 重复投递的任务
+        return None
+
+    limit = settings.ORDER_SKU_CONCURRENCY
+    if limit and not acquire_sku_slots(cart_dict.keys(), limit, token):
+        if self.request.retries >= self.max_retries:
+            update_ticket(ticket, status='failed', reason='下单人数过多,请稍后重试')
+            return None
+        raise self.retry(countdown=constants.ORDER_SLOT_RETRY_COUNTDOWN)
+
+    update_ticket(ticket, status='processing')
+    try:
+        user = User.objects.get(id=user_id)
+        address = Address.objects.get(id=address_id)
+        order = place_order(user, address, pay_method, cart_dict, prices, Decimal(freight))
+    except Exception as e:
+        detail = placement_error(e)
+        if detail is None:
+            logger.error('[place_order] %s' % e)
+            detail = '下单失败'
+        update_ticket(ticket, status='failed', reason=detail)
+        return None
+    finally:
+        if limit:
+            release_sku_slots(cart_dict.keys(), token)
+
+    update_ticket(ticket, status='created', order_id=order.order_id)
+    return order.order_id
+
+
+@app.task(name='cancel_expired_orders')
+def cancel_expired_orders_task():
+    """
+    取消超过支付期限的未支付订单,归还库存
+    """
+    return cancel_expired_orders()
+
+
+@app.task(name='flush_sales')
+def flush_sales_task():
+    """
+    把redis中缓冲的商品与SPU销量同步到mysql
+    """
+    result = flush_sales()
+    if result is None:
+        # 上一次同步还没有结束
+        return None
+    skus, goods = result
+    return {'skus': skus, 'goods': goods}
@@ -0,0 +1,11 @@
+from celery_tasks.main import app
+
+from payments.notify import process_payments
+
+
+@app.task(name='process_payments')
+def process_payments_task():
+    """
+    批量保存队列中的支付结果通知
+    """
+    return process_payments()
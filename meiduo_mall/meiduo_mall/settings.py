@@ -178,6 +178,13 @@ CACHES = {
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
         }
+    },
+    "orders": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": "redis://127.0.0.1:6379/5",
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+        }
     }
 
 }
@@ -304,6 +311,32 @@ CKEDITOR_CONFIGS = {
 }
 CKEDITOR_UPLOAD_PATH = ''  # 上传图片保存路径，使用了FastDFS，所以此处设为''
 
+# 购物车cookie兼容旧的pickle格式,过渡期结束后改为False
+CART_COOKIE_PICKLE_COMPAT = True
+# 未登录用户购物车的保存方式: 'cookie'保存在cookie中, 'token'保存在redis中,cookie中只保存令牌
+CART_ANONYMOUS_STORAGE = 'cookie'
+# 登录用户的购物车与浏览记录在最后一次操作后保留的秒数,每次操作刷新,0表示不过期
+CART_RETENTION = 60 * 60 * 24 * 90
+HISTORY_RETENTION = 60 * 60 * 24 * 30
+
+# 下单时扣减库存的方式: 'database'在mysql中加锁扣减, 'redis'在redis中预先扣减,由celery任务sync_inventory定期同步到mysql
+ORDER_INVENTORY_MODE = 'database'
+# 生成订单编号的类,实例可以调用,参数为下单用户,返回订单编号字符串
+ORDER_ID_GENERATOR = 'orders.ids.TimeSequenceOrderIdGenerator'
+# 是否异步下单: 下单接口返回202与下单凭证,由celery任务扣减库存并保存订单
+# 前端收到202时轮询/orders/tickets/<ticket>/查询结果(place_order.js的poll_ticket)
+ORDER_PLACEMENT_ASYNC = False
+# 异步下单时同一商品同时执行的下单任务数量,0表示不限制
+ORDER_SKU_CONCURRENCY = 20
+# 是否在redis中缓冲下单与取消订单引起的销量变化,由celery任务flush_sales定期同步到mysql,下单时不更新SPU的行
+ORDER_SALES_BUFFERED = True
+# 是否异步处理支付结果通知: 验证签名后加入redis队列立即返回,由celery任务process_payments批量保存
+PAYMENT_NOTIFY_ASYNC = True
+# 核对支付结果时查询支付网关的类: 'payments.gateways.AlipayGatewayClient'使用支付宝交易查询接口,
+# 'payments.gateways.HttpGatewayClient'查询PAYMENT_GATEWAY_URL,用于对接script/fake_gateway.py
+PAYMENT_GATEWAY_CLIENT = 'payments.gateways.AlipayGatewayClient'
+PAYMENT_GATEWAY_URL = 'http://127.0.0.1:8090'
+
 # 生成的静态html文件保存目录
 GENERATED_STATIC_HTML_FILES_DIR = os.path.join(os.path.dirname(BASE_DIR), 'front_end_pc')
 
@@ -311,7 +344,13 @@ GENERATED_STATIC_HTML_FILES_DIR = os.path.join(os.path.dirname(BASE_DIR), 'front
 CRONJOBS = [
     # 每5分钟执行一次生成主页静态文件
     ('*/5 * * * *', 'contents.crons.generate_static_index_html',
-     '>> /home/python/Resource/MeiDuo/meiduo_mall/logs/crontab.log')
+     '>> /home/python/Resource/MeiDuo/meiduo_mall/logs/crontab.log'),
+    # 每天凌晨清理长期没有操作的购物车与浏览记录
+    ('30 4 * * *', 'django.core.management.call_command', ['sweep_carts'],
+     {}, '>> /home/python/Resource/MeiDuo/meiduo_mall/logs/crontab.log'),
+    # 每10分钟核对丢失支付通知的订单,在超时取消之前补存支付记录
+    ('*/10 * * * *', 'django.core.management.call_command', ['reconcile_payments'],
+     {}, '>> /home/python/Resource/MeiDuo/meiduo_mall/logs/crontab.log'),
 ]
 
 # 解决crontab中文问题
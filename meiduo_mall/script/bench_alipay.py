@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# 对比生成支付宝支付参数的耗时:
+# 每次新建客户端(读取并解析密钥文件)后签名、复用进程内的客户端签名、读取缓存的签名
+# 使用方式: cd script && ./bench_alipay.py [重复次数]
+import sys
+
+sys.path.insert(0, '../')
+
+import os
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "meiduo_mall.settings")
+
+import django
+
+django.setup()
+
+import datetime
+import timeit
+from alipay import AliPay
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from payments.utils import get_alipay, get_alipay_key_paths, get_alipay_order_string, ALIPAY_ORDER_STRING_KEY
+
+ORDER_ID = '20180901000000000000001'
+TOTAL_AMOUNT = '1999.00'
+DEADLINE = timezone.now().replace(microsecond=0) + datetime.timedelta(minutes=30)
+TIME_EXPIRE = timezone.localtime(DEADLINE).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def sign(alipay):
+    return alipay.api_alipay_trade_page_pay(
+        out_trade_no=ORDER_ID,
+        total_amount=TOTAL_AMOUNT,
+        subject="美多商城支付" + ORDER_ID,
+        return_url=settings.RETURN_URL,
+        time_expire=TIME_EXPIRE
+    )
+
+
+def sign_with_new_client():
+    private_key_path, public_key_path = get_alipay_key_paths()
+    alipay = AliPay(
+        appid=settings.ALIPAY_APPID,
+        app_notify_url=None,
+        app_private_key_path=private_key_path,
+        alipay_public_key_path=public_key_path,
+        sign_type="RSA2",
+        debug=settings.ALIPAY_DEBUG
+    )
+    return sign(alipay)
+
+
+def sign_with_cached_client():
+    return sign(get_alipay())
+
+
+def cached_order_string():
+    return get_alipay_order_string(ORDER_ID, TOTAL_AMOUNT, DEADLINE)
+
+
+def cost_ms(func, number):
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1000
+
+
+if __name__ == '__main__':
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    cache.delete(ALIPAY_ORDER_STRING_KEY % (ORDER_ID, TOTAL_AMOUNT, TIME_EXPIRE.replace(' ', '_'), get_alipay().key_version))
+    cached_order_string()
+
+    results = [
+        ('每次新建客户端并签名', cost_ms(sign_with_new_client, number)),
+        ('复用客户端并签名', cost_ms(sign_with_cached_client, number)),
+        ('读取缓存的签名', cost_ms(cached_order_string, number)),
+    ]
+    baseline = results[0][1]
+    print('%-20s %12s %10s' % ('方式', '每次耗时(ms)', '相对耗时'))
+    for name, cost in results:
+        print('%-20s %12.3f %9.1f%%' % (name, cost, cost / baseline * 100))
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# 对比购物车cookie的编码方式: 原来的pickle + base64 与 cart_codec
+# 统计1~200件商品时的编码、解码耗时与cookie长度
+# 使用方式: cd script && ./bench_cart_codec.py [重复次数]
+import sys
+
+sys.path.insert(0, '../')
+
+import os
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "meiduo_mall.settings")
+
+import django
+
+django.setup()
+
+import base64
+import pickle
+import random
+import timeit
+from utils import cart_codec
+
+ITEM_COUNTS = (1, 5, 10, 20, 50, 100, 200)
+
+
+def pickle_dumps(cart_dict):
+    return base64.b64encode(pickle.dumps(cart_dict)).decode()
+
+
+def pickle_loads(cart_str):
+    return pickle.loads(base64.b64decode(cart_str.encode()))
+
+
+def make_cart(items):
+    sku_ids = random.sample(range(1, 100000), items)
+    return {sku_id: {'count': random.randint(1, 10), 'selected': random.random() < 0.8} for sku_id in sku_ids}
+
+
+def cost_us(func, arg, number):
+    return min(timeit.repeat(lambda: func(arg), number=number, repeat=3)) / number * 1000000
+
+
+if __name__ == '__main__':
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    random.seed(0)
+
+    print('%6s | %10s %10s | %12s %12s | %12s %12s' % (
+        '商品数', 'pickle字节', 'codec字节', 'pickle编码us', 'codec编码us', 'pickle解码us', 'codec解码us'))
+    for items in ITEM_COUNTS:
+        cart_dict = make_cart(items)
+        pickle_str = pickle_dumps(cart_dict)
+        codec_str = cart_codec.dumps(cart_dict)
+        assert cart_codec.loads(codec_str) == cart_dict
+        # 旧cookie在过渡期内仍然可以读取
+        assert cart_codec.loads(pickle_str) == cart_dict
+
+        print('%6d | %10d %10d | %12.2f %12.2f | %12.2f %12.2f' % (
+            items, len(pickle_str), cart_codec.encoded_size(cart_dict),
+            cost_us(pickle_dumps, cart_dict, number), cost_us(cart_codec.dumps, cart_dict, number),
+            cost_us(pickle_loads, pickle_str, number), cost_us(cart_codec.loads, codec_str, number)))
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# 对比购物车两种存储格式占用的内存
+# 旧格式: cart%d(hash) + cart_selected%d(set), 新格式: cart_packed%d(hash)
+# 使用方式: cd script && ./bench_cart_memory.py [用户数量]
+import sys
+
+sys.path.insert(0, '../')
+
+import os
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "meiduo_mall.settings")
+
+import django
+
+django.setup()
+
+import random
+from django_redis import get_redis_connection
+from carts.storage import RedisCart
+
+# 压测使用的用户编号,避免与真实用户的购物车冲突
+BENCH_USER_ID = 900000000
+
+
+def used_memory(redis_cli):
+    return redis_cli.info('memory')['used_memory']
+
+
+def keys_memory(redis_cli, keys):
+    """
+    统计指定键占用的内存
+    """
+    pl = redis_cli.pipeline(transaction=False)
+    for key in keys:
+        pl.execute_command('MEMORY', 'USAGE', key)
+    return sum(size or 0 for size in pl.execute())
+
+
+if __name__ == '__main__':
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    redis_cli = get_redis_connection('carts')
+    user_ids = range(BENCH_USER_ID, BENCH_USER_ID + users)
+    carts = [RedisCart(user_id, redis_cli) for user_id in user_ids]
+
+    # 按旧格式生成购物车,每个购物车1~20件商品,约六成选中
+    random.seed(0)
+    before = used_memory(redis_cli)
+    pl = redis_cli.pipeline(transaction=False)
+    for cart in carts:
+        sku_ids = random.sample(range(1, 5000), random.randint(1, 20))
+        pl.hmset(cart.legacy_keys[0], {sku_id: random.randint(1, 5) for sku_id in sku_ids})
+        selected = [sku_id for sku_id in sku_ids if random.random() < 0.6]
+        if selected:
+            pl.sadd(cart.legacy_keys[1], *selected)
+    pl.execute()
+    legacy_used = used_memory(redis_cli) - before
+    legacy_keys = keys_memory(redis_cli, [key for cart in carts for key in cart.legacy_keys])
+
+    # 转换为新格式
+    pl = redis_cli.pipeline(transaction=False)
+    for cart in carts:
+        cart.migrate(client=pl)
+    pl.execute()
+    packed_used = used_memory(redis_cli) - before
+    packed_keys = keys_memory(redis_cli, [cart.key for cart in carts])
+
+    print('用户数量: %d' % users)
+    print('%-10s %16s %16s' % ('格式', 'used_memory增量', 'MEMORY USAGE合计'))
+    print('%-10s %16d %16d' % ('旧格式', legacy_used, legacy_keys))
+    print('%-10s %16d %16d' % ('新格式', packed_used, packed_keys))
+    print('每个购物车: 旧格式%.1f字节, 新格式%.1f字节, 节省%.1f%%' % (
+        legacy_keys / users, packed_keys / users, (1 - packed_keys / max(legacy_keys, 1)) * 100))
+
+    redis_cli.delete(*[key for cart in carts for key in (cart.key, cart.summary_key)])
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# 对比登录用户购物车修改操作:原来的多条命令 与 lua脚本一次往返
+# 统计每个请求的redis命令数与p99延迟
+# 使用方式: cd script && ./bench_cart_scripts.py [请求次数]
+import sys
+
+sys.path.insert(0, '../')
+
+import os
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "meiduo_mall.settings")
+
+import django
+
+django.setup()
+
+import time
+import redis
+from django.conf import settings
+from carts.storage import RedisCart
+
+# 压测使用的用户编号,避免与真实用户的购物车冲突
+BENCH_USER_ID = 900000000
+SKU_IDS = list(range(1, 21))
+
+
+class CountingRedis(redis.StrictRedis):
+    """
+    统计发送到redis的命令数
+    """
+    commands = 0
+
+    def execute_command(self, *args, **options):
+        self.commands += 1
+        return super().execute_command(*args, **options)
+
+
+def legacy_add(redis_cli, user_id, sku_id, count):
+    redis_cli.hincrby('cart%d' % user_id, sku_id, count)
+    redis_cli.sadd('cart_selected%d' % user_id, sku_id)
+
+
+def legacy_update(redis_cli, user_id, sku_id, count):
+    redis_cli.hset('cart%d' % user_id, sku_id, count)
+    redis_cli.srem('cart_selected%d' % user_id, sku_id)
+
+
+def legacy_select_all(redis_cli, user_id):
+    sku_ids = redis_cli.hkeys('cart%d' % user_id)
+    redis_cli.sadd('cart_selected%d' % user_id, *sku_ids)
+
+
+def legacy_delete(redis_cli, user_id, sku_id):
+    redis_cli.hdel('cart%d' % user_id, sku_id)
+    redis_cli.srem('cart_selected%d' % user_id, sku_id)
+
+
+def legacy_merge(redis_cli, user_id, cart_dict):
+    for sku_id, item in cart_dict.items():
+        redis_cli.hset('cart%d' % user_id, sku_id, item.get('count'))
+        if item.get('selected'):
+            redis_cli.sadd('cart_selected%d' % user_id, sku_id)
+        else:
+            redis_cli.srem('cart_selected%d' % user_id, sku_id)
+
+
+def script_cases(redis_cli, user_id):
+    cart = RedisCart(user_id, redis_cli)
+    merge_dict = {sku_id: {'count': 2, 'selected': sku_id % 2 == 0} for sku_id in SKU_IDS}
+    return {
+        'add': lambda i: cart.add(SKU_IDS[i % 20], 1, True),
+        'update': lambda i: cart.update(SKU_IDS[i % 20], 3, False),
+        'select_all': lambda i: cart.select_all(True),
+        'delete': lambda i: cart.delete(SKU_IDS[i % 20]),
+        'merge': lambda i: cart.merge(merge_dict),
+    }
+
+
+def legacy_cases(redis_cli, user_id):
+    merge_dict = {sku_id: {'count': 2, 'selected': sku_id % 2 == 0} for sku_id in SKU_IDS}
+    return {
+        'add': lambda i: legacy_add(redis_cli, user_id, SKU_IDS[i % 20], 1),
+        'update': lambda i: legacy_update(redis_cli, user_id, SKU_IDS[i % 20], 3),
+        'select_all': lambda i: legacy_select_all(redis_cli, user_id),
+        'delete': lambda i: legacy_delete(redis_cli, user_id, SKU_IDS[i % 20]),
+        'merge': lambda i: legacy_merge(redis_cli, user_id, merge_dict),
+    }
+
+
+def run(redis_cli, func, times):
+    """
+    :return: (每个请求的命令数, p99延迟毫秒)
+    """
+    # 预热,保证脚本已加载到服务器
+    func(0)
+    redis_cli.commands = 0
+    costs = []
+    for i in range(times):
+        start = time.perf_counter()
+        func(i)
+        costs.append(time.perf_counter() - start)
+    costs.sort()
+    p99 = costs[min(len(costs) - 1, int(len(costs) * 0.99))] * 1000
+    return redis_cli.commands / times, p99
+
+
+if __name__ == '__main__':
+    times = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    redis_cli = CountingRedis.from_url(settings.CACHES['carts']['LOCATION'])
+
+    legacy = legacy_cases(redis_cli, BENCH_USER_ID)
+    lua = script_cases(redis_cli, BENCH_USER_ID + 1)
+
+    print('%-12s %14s %14s %14s %14s' % ('操作', '原命令数/请求', '脚本命令数/请求', '原p99(ms)', '脚本p99(ms)'))
+    for name in legacy:
+        # 每个操作前准备一个已有20件商品的购物车
+        legacy_merge(redis_cli, BENCH_USER_ID, {sku_id: {'count': 1, 'selected': True} for sku_id in SKU_IDS})
+        legacy_commands, legacy_p99 = run(redis_cli, legacy[name], times)
+        RedisCart(BENCH_USER_ID + 1, redis_cli).merge({sku_id: {'count': 1, 'selected': True} for sku_id in SKU_IDS})
+        lua_commands, lua_p99 = run(redis_cli, lua[name], times)
+        print('%-12s %14.1f %14.1f %14.3f %14.3f' % (name, legacy_commands, lua_commands, legacy_p99, lua_p99))
+
+    for user_id in (BENCH_USER_ID, BENCH_USER_ID + 1):
+        cart = RedisCart(user_id, redis_cli)
+        redis_cli.delete(cart.key, cart.summary_key, *cart.legacy_keys)
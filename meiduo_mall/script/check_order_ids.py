@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# 检查订单编号生成器在多进程、多线程下不会重复
+# 父进程先生成一个编号,再fork出多个子进程,验证子进程会重新分配进程编号
+# 再把分配计数器调到超过1000、循环到父进程编号的位置,验证不会分配到正在使用的编号
+# 最后租用所有剩余的编号,验证没有空闲编号时会抛出异常
+# 检查期间会占用所有进程编号,子进程的租约在ORDER_ID_WORKER_LEASE秒后过期,不要在正在下单的环境中运行
+# 使用方式: cd script && ./check_order_ids.py [进程数] [每个进程生成的数量] [每个进程的线程数]
+import sys
+
+sys.path.insert(0, '../')
+
+import os
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "meiduo_mall.settings")
+
+import django
+
+django.setup()
+
+import multiprocessing
+import threading
+import time
+from django_redis import get_redis_connection
+from orders.ids import generate_order_id, OrderIdWorkersExhausted, TimeSequenceOrderIdGenerator, \
+    ORDER_ID_WORKER_NEXT_KEY
+
+
+def get_worker_id(order_id):
+    """
+    :return: 订单编号中的进程编号
+    """
+    return int(str(order_id)[14:14 + TimeSequenceOrderIdGenerator.WORKER_DIGITS])
+
+
+def generate(count, threads):
+    """
+    在子进程中用多个线程生成订单编号
+    :return: 整数形式的订单编号列表
+    """
+    results = [[] for _ in range(threads)]
+
+    def run(result, n):
+        for _ in range(n):
+            result.append(int(generate_order_id()))
+
+    workers = [threading.Thread(target=run, args=(results[i], count // threads + (i < count % threads)))
+               for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return [order_id for result in results for order_id in result]
+
+
+if __name__ == '__main__':
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 250000
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+
+    parent_id = generate_order_id()
+    start = time.time()
+    with multiprocessing.get_context('fork').Pool(processes) as pool:
+        chunks = pool.starmap(generate, [(count, threads)] * processes)
+    cost = time.time() - start
+
+    total = sum(len(chunk) for chunk in chunks)
+    ids = set(order_id for chunk in chunks for order_id in chunk)
+    ids.add(int(parent_id))
+    # 每个子进程只使用一个进程编号,并且与父进程、其它子进程都不相同
+    parent_worker = get_worker_id(parent_id)
+    workers = [{get_worker_id(order_id) for order_id in chunk} for chunk in chunks]
+    workers_distinct = (all(len(worker) == 1 for worker in workers) and
+                        len(set.union({parent_worker}, *workers)) == processes + 1)
+    used_workers = set.union({parent_worker}, *workers)
+
+    # 计数器循环后从父进程的编号开始尝试,应该跳过正在使用的编号
+    worker_limit = 10 ** TimeSequenceOrderIdGenerator.WORKER_DIGITS
+    get_redis_connection('orders').set(ORDER_ID_WORKER_NEXT_KEY, worker_limit * 5 + parent_worker - 1)
+    held = [TimeSequenceOrderIdGenerator()]
+    held[0]()
+    wrapped_worker = held[0].worker_id
+
+    # 子进程退出后租约还没有过期,租用剩余的编号直到没有空闲
+    exhausted = False
+    try:
+        while len(held) <= worker_limit:
+            generator = TimeSequenceOrderIdGenerator()
+            generator()
+            held.append(generator)
+    except OrderIdWorkersExhausted:
+        exhausted = True
+    held_workers = {generator.worker_id for generator in held}
+    held_distinct = len(held_workers) == len(held) and not held_workers & used_workers
+    # 这些生成器不会再生成编号,可以直接删除租约
+    for generator in held:
+        generator.lease.release()
+    # 单线程时每个进程内的编号应该递增
+    ordered = all(chunk == sorted(chunk) for chunk in chunks) if threads == 1 else '多线程时不检查'
+
+    print('%d个进程 x %d个线程, 共生成%d个编号, 耗时%.2f秒, 每秒%.0f个' % (
+        processes, threads, total, cost, total / cost))
+    print('重复的编号: %d个' % (total + 1 - len(ids)))
+    print('进程内有序: %s' % ordered)
+    print('编号长度: %s' % sorted({len(str(order_id)) for order_id in ids}))
+    print('子进程的进程编号互不相同: %s' % workers_distinct)
+    print('计数器循环到父进程编号%d时分配到: %d' % (parent_worker, wrapped_worker))
+    print('租用剩余的%d个编号后抛出异常: %s, 编号互不相同: %s' % (len(held), exhausted, held_distinct))
+    if total + 1 != len(ids) or not workers_distinct or wrapped_worker in used_workers or not exhausted \
+            or not held_distinct:
+        sys.exit(1)
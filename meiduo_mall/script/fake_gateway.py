@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# 本地模拟的支付网关,用于测试支付结果核对(reconcile_payments)
+# GET /trades/<order_id>/ 返回 {"out_trade_no":, "trade_no":, "trade_status":}
+# 按订单编号的哈希决定是否已经支付,同一订单每次返回相同的结果
+# 使用方式: cd script && ./fake_gateway.py [端口] [已支付的百分比] [每次请求的延迟毫秒数]
+# 同时在settings中设置 PAYMENT_GATEWAY_CLIENT = 'payments.gateways.HttpGatewayClient'
+import json
+import re
+import sys
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class GatewayHandler(BaseHTTPRequestHandler):
+    paid_percent = 30
+    latency = 0.05
+
+    def do_GET(self):
+        match = re.match(r'^/trades/(\w+)/$', self.path)
+        if match is None:
+            self.send_error(404)
+            return
+        order_id = match.group(1)
+        time.sleep(self.latency)
+        if zlib.crc32(order_id.encode()) % 100 < self.paid_percent:
+            data = {'out_trade_no': order_id, 'trade_no': 'FAKE' + order_id, 'trade_status': 'TRADE_SUCCESS'}
+        else:
+            data = {'out_trade_no': order_id, 'trade_no': None, 'trade_status': 'WAIT_BUYER_PAY'}
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8090
+    GatewayHandler.paid_percent = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    GatewayHandler.latency = (int(sys.argv[3]) if len(sys.argv) > 3 else 50) / 1000
+
+    print('模拟支付网关: http://127.0.0.1:%d, 已支付%d%%, 延迟%dms' % (
+        port, GatewayHandler.paid_percent, GatewayHandler.latency * 1000))
+    ThreadingHTTPServer(('127.0.0.1', port), GatewayHandler).serve_forever()
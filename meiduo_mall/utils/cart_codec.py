@@ -0,0 +1,124 @@
+"""
+购物车cookie的编解码
+格式: 版本号(1字节) + 数据
+    版本1: 每件商品固定6字节, sku_id(4字节) + 数量与选中状态(2字节, 最高位为选中状态)
+    版本2: 版本1的数据使用zlib压缩
+编码结果使用urlsafe的base64, 去掉末尾的'='
+兼容旧的pickle格式的cookie, 过渡期结束后将CART_COOKIE_PICKLE_COMPAT设置为False即可关闭
+"""
+import base64
+import binascii
+import io
+import pickle
+import struct
+import zlib
+from django.conf import settings
+
+VERSION_PACKED = 1
+VERSION_COMPRESSED = 2
+# 旧格式pickle数据的第一个字节
+LEGACY_PICKLE = pickle.PROTO[0]
+
+# 商品数量使用15位保存
+MAX_COUNT = 0x7fff
+SELECTED_FLAG = 0x8000
+
+_ITEM_FORMAT = 'IH'
+_ITEM_SIZE = struct.calcsize('>' + _ITEM_FORMAT)
+
+# 商品较少时压缩没有收益,直接跳过
+COMPRESS_MIN_ITEMS = 8
+
+
+def dumps(cart_dict):
+    """
+    购物车字典编码为cookie字符串
+    :param cart_dict: {sku_id: {'count': count, 'selected': selected}}
+    :return: cookie字符串
+    """
+    values = []
+    for sku_id, item in sorted(cart_dict.items()):
+        values.append(sku_id)
+        values.append(min(item['count'], MAX_COUNT) | (SELECTED_FLAG if item['selected'] else 0))
+    packed = struct.pack('>' + _ITEM_FORMAT * len(cart_dict), *values)
+    data = bytes([VERSION_PACKED]) + packed
+    if len(cart_dict) >= COMPRESS_MIN_ITEMS:
+        compressed = bytes([VERSION_COMPRESSED]) + zlib.compress(packed)
+        if len(compressed) < len(data):
+            data = compressed
+
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def loads(cart_str):
+    """
+    cookie字符串解码为购物车字典,数据无效时返回空字典
+    :param cart_str: cookie字符串
+    :return: {sku_id: {'count': count, 'selected': selected}}
+    """
+    try:
+        # 旧格式使用标准的base64,统一转换为urlsafe再解码
+        cart_str = cart_str.replace('+', '-').replace('/', '_').rstrip('=')
+        data = base64.urlsafe_b64decode(cart_str + '=' * (-len(cart_str) % 4))
+    except (binascii.Error, ValueError):
+        return {}
+    if not data:
+        return {}
+
+    version, body = data[0], data[1:]
+    try:
+        if version == VERSION_PACKED:
+            return _unpack(body)
+        if version == VERSION_COMPRESSED:
+            return _unpack(zlib.decompress(body))
+        if version == LEGACY_PICKLE and getattr(settings, 'CART_COOKIE_PICKLE_COMPAT', True):
+            return _check_legacy(_RestrictedUnpickler(io.BytesIO(data)).load())
+    except (struct.error, zlib.error, pickle.UnpicklingError, EOFError, ValueError):
+        pass
+    return {}
+
+
+def encoded_size(cart_dict):
+    """
+    购物车编码后的cookie长度
+    """
+    return len(dumps(cart_dict))
+
+
+def _unpack(body):
+    if len(body) % _ITEM_SIZE:
+        raise ValueError('购物车cookie长度无效')
+    values = struct.unpack('>' + _ITEM_FORMAT * (len(body) // _ITEM_SIZE), body)
+    cart_dict = {}
+    for sku_id, value in zip(values[::2], values[1::2]):
+        cart_dict[sku_id] = {
+            'count': value & MAX_COUNT,
+            'selected': bool(value & SELECTED_FLAG)
+        }
+    return cart_dict
+
+
+def _check_legacy(cart_dict):
+    """
+    旧格式的数据由客户端提供,结构不是{sku_id: {'count': count, 'selected': selected}}时作为空购物车
+    """
+    def is_int(value):
+        return isinstance(value, int) and not isinstance(value, bool)
+
+    if not isinstance(cart_dict, dict):
+        return {}
+    for sku_id, item in cart_dict.items():
+        if not (is_int(sku_id) and sku_id > 0 and isinstance(item, dict) and is_int(item.get('count'))
+                and item['count'] > 0 and isinstance(item.get('selected'), bool)):
+            return {}
+    return {sku_id: {'count': min(item['count'], MAX_COUNT), 'selected': item['selected']}
+            for sku_id, item in cart_dict.items()}
+
+
+class _RestrictedUnpickler(pickle.Unpickler):
+    """
+    旧格式的cookie只包含字典、整数与布尔值,禁止加载任何类,避免执行cookie中的代码
+    """
+
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError('购物车cookie中不允许出现%s.%s' % (module, name))
@@ -1,4 +1,13 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import datetime
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination, BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class StandardResultsSetPagination(PageNumberPagination):
@@ -8,3 +17,100 @@ class StandardResultsSetPagination(PageNumberPagination):
     page_size_query_param = 'page_size'
     # 指定每页最多显示的数据量为20条
     max_page_size = 20
+
+
+class KeysetPagination(BasePagination):
+    """
+    按照排序字段的值分页,下一页从上一页最后一条数据之后开始查询
+    不使用OFFSET,翻到后面的页也只扫描一页的数据,需要排序字段上的联合索引
+    """
+    # 排序字段,可以是升序或降序,最后一个字段需要唯一
+    ordering = ('-create_time', '-id')
+    cursor_query_param = 'cursor'
+    page_size = 5
+    page_size_query_param = 'page_size'
+    max_page_size = 20
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_ordering(self, request, queryset, view):
+        """
+        :return: 本次分页使用的排序字段
+        """
+        return self.ordering
+
+    def decode_cursor(self, request, queryset):
+        """
+        :return: 排序字段的值列表,没有游标时返回None
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode()).decode())
+            # 游标中记录了排序字段,排序方式改变后旧的游标不能再使用
+            if not isinstance(cursor, dict) or cursor.get('o') != list(self.current_ordering):
+                raise ValueError()
+            values = cursor['v']
+            fields = [queryset.model._meta.get_field(name.lstrip('-')) for name in self.current_ordering]
+            if not isinstance(values, list) or len(values) != len(fields):
+                raise ValueError()
+            return [field.to_python(value) for field, value in zip(fields, values)]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound('无效的游标')
+
+    def encode_cursor(self, obj):
+        # 时间保留微秒,否则同一毫秒内的数据会被跳过
+        values = [value.isoformat() if isinstance(value, datetime) else str(value)
+                  for value in (getattr(obj, name.lstrip('-')) for name in self.current_ordering)]
+        cursor = {'o': list(self.current_ordering), 'v': values}
+        return urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        :param queryset: 查询集,或者字段相同的多个查询集的列表(例如订单表与归档表),每个查询集各查询一页后合并
+        """
+        self.request = request
+        querysets = queryset if isinstance(queryset, (list, tuple)) else [queryset]
+        self.current_ordering = tuple(self.get_ordering(request, querysets[0], view))
+        names = [name.lstrip('-') for name in self.current_ordering]
+        lookups = ['__lt' if name.startswith('-') else '__gt' for name in self.current_ordering]
+        values = self.decode_cursor(request, querysets[0])
+        page_size = self.get_page_size(request)
+
+        page = []
+        for queryset in querysets:
+            queryset = queryset.order_by(*self.current_ordering)
+            if values is not None:
+                # (a, b) < (x, y) 展开为 a < x or (a = x and b < y), 升序的字段使用 >
+                condition = Q()
+                for i, name in enumerate(names):
+                    condition |= Q(**dict(zip(names[:i], values[:i]), **{name + lookups[i]: values[i]}))
+                queryset = queryset.filter(condition)
+            # 多查询一条,判断是否还有下一页
+            page.extend(queryset[:page_size + 1])
+
+        if len(querysets) > 1:
+            # 从最后一个排序字段开始依次稳定排序,支持升序降序混合
+            for name in reversed(self.current_ordering):
+                page.sort(key=lambda obj: getattr(obj, name.lstrip('-')), reverse=name.startswith('-'))
+        self.has_next = len(page) > page_size
+        page = page[:page_size]
+        self.next_cursor = self.encode_cursor(page[-1]) if self.has_next else None
+        return page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
@@ -0,0 +1,68 @@
+"""
+redis中带有持有者标识的锁
+加锁时写入随机的标识,续期与释放前比较标识,锁过期后被其它进程获得时,原持有者不会续期或删除别人的锁
+"""
+import uuid
+from utils.redis_script import get_script
+
+# KEYS[1]: 锁, ARGV[1]: 持有者标识, ARGV[2]: 有效期(秒)
+_REFRESH_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# KEYS[1]: 锁, ARGV[1]: 持有者标识
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisLock(object):
+    """
+    用法:
+        lock = RedisLock(redis_cli, key, expires)
+        if not lock.acquire():
+            return
+        try:
+            while ...:
+                if not lock.refresh():
+                    # 锁已经过期,其它进程可能已经开始处理
+                    break
+                ...
+        finally:
+            lock.release()
+    """
+    def __init__(self, redis_cli, key, expires, token=None):
+        """
+        :param token: 持有者标识,已经通过其它方式写入锁时传入,默认随机生成
+        """
+        self.redis_cli = redis_cli
+        self.key = key
+        self.expires = expires
+        self.token = token or uuid.uuid4().hex
+
+    def acquire(self):
+        """
+        :return: 是否获得了锁
+        """
+        return bool(self.redis_cli.set(self.key, self.token, nx=True, ex=self.expires))
+
+    def refresh(self):
+        """
+        重新设置有效期
+        :return: 是否仍然持有锁
+        """
+        return bool(get_script(self.redis_cli, _REFRESH_SCRIPT)(
+            keys=[self.key], args=[self.token, self.expires], client=self.redis_cli))
+
+    def release(self):
+        """
+        只删除自己持有的锁
+        :return: 是否删除了锁
+        """
+        return bool(get_script(self.redis_cli, _RELEASE_SCRIPT)(keys=[self.key], args=[self.token], client=self.redis_cli))
@@ -0,0 +1,21 @@
+"""
+redis的lua脚本注册
+"""
+
+# 已注册的脚本对象,每个进程只计算一次sha1
+_registered = {}
+
+
+def get_script(redis_cli, source):
+    """
+    获取注册后的脚本对象,调用时使用EVALSHA,服务器中没有缓存时自动加载
+    脚本对象在所有连接之间共用,调用时需要通过client参数传入使用的连接或管道
+    :param redis_cli: redis连接
+    :param source: lua脚本
+    :return: Script对象
+    """
+    script = _registered.get(source)
+    if script is None:
+        script = redis_cli.register_script(source)
+        _registered[source] = script
+    return script